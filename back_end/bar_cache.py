@@ -0,0 +1,179 @@
+"""
+Server-side cache of FMP intraday/daily chart bars for /ws/getcustombars.
+
+Bars are kept per (ticker, timeframe) and per trading day. A day whose session has
+closed can no longer change, so once fetched it is kept for as long as the series
+stays in the cache. The cache is bounded by the total number of cached bars
+(BAR_CACHE_MAX_BARS); least recently used series are evicted to stay under it.
+A request only fetches the days it is missing, grouped into contiguous runs, and
+the answer is stitched together from cache. The current session is never cached.
+Weekends and exchange holidays count as covered without asking FMP.
+"""
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from fmp_client import FMP_BASE_URL, async_fmp_client
+from market_calendar import nyse_calendar
+
+logger = logging.getLogger(__name__)
+
+# Bars held across all series; a bar is a small dict, roughly 0.5 KB
+BAR_CACHE_MAX_BARS = int(os.getenv("BAR_CACHE_MAX_BARS", "250000"))
+# Minutes after the close before a session's bars are treated as final
+BAR_CACHE_SETTLE_MINUTES = 15
+
+NY = ZoneInfo("America/New_York")
+
+
+def parse_day(value: str) -> Optional[date]:
+    """'YYYY-MM-DD[...]' or a millisecond epoch (NY date); None if neither"""
+    value = str(value).strip()
+    try:
+        if value.isdigit():
+            return datetime.fromtimestamp(int(value) / 1000, NY).date()
+        return date.fromisoformat(value[:10])
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+def is_closed_day(d: date, now: Optional[datetime] = None) -> bool:
+    """True once d's session (if any) is over and its bars can no longer change"""
+    now = now or datetime.now(NY)
+    today = now.date()
+    if d != today:
+        return d < today
+    close = nyse_calendar.session_close(d)
+    if close is None:
+        return True
+    settled = datetime.combine(d, close, NY) + timedelta(minutes=BAR_CACHE_SETTLE_MINUTES)
+    return now >= settled
+
+
+class BarSeries:
+    def __init__(self):
+        # Closed days only: day -> bars of that day (FMP order, newest first)
+        self.days: Dict[date, List[Dict[str, Any]]] = {}
+        self.bars = 0
+        self.lock = asyncio.Lock()
+
+
+class BarCache:
+    def __init__(self, max_bars: int = BAR_CACHE_MAX_BARS):
+        self.max_bars = max(1, max_bars)
+        self._series: "OrderedDict[Tuple[str, str], BarSeries]" = OrderedDict()
+        self.total_bars = 0
+        self.requests = 0
+        self.fully_cached = 0
+        self.fmp_fetches = 0
+        self.evictions = 0
+
+    def _series_for(self, ticker: str, timeframe: str) -> BarSeries:
+        key = (ticker, timeframe)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = BarSeries()
+        self._series.move_to_end(key)
+        return series
+
+    def _added(self, key: Tuple[str, str], series: BarSeries, bars: int):
+        """Count bars just cached in series and evict least recently used series over the cap"""
+        series.bars += bars
+        if self._series.get(key) is not series:
+            # Evicted while its fetch was in flight; those bars aren't held by the cache
+            return
+        self.total_bars += bars
+        # May evict series itself if it alone is over the cap; its response is already built
+        while self.total_bars > self.max_bars and self._series:
+            _, evicted = self._series.popitem(last=False)
+            self.total_bars -= evicted.bars
+            self.evictions += 1
+
+    async def _fetch(self, ticker: str, timeframe: str, start: str, end: str) -> List[Dict[str, Any]]:
+        self.fmp_fetches += 1
+        url = f"{FMP_BASE_URL}/historical-chart/{timeframe}/{ticker}"
+        params = {"from": start, "to": end, "apikey": os.getenv("FMP_API_KEY")}
+        return await async_fmp_client.get_json(url, params, timeout=30) or []
+
+    @staticmethod
+    def _missing_runs(series: BarSeries, start: date, end: date) -> List[Tuple[date, date]]:
+        """Contiguous [first, last] runs of days in [start, end] that must come from FMP"""
+        runs: List[Tuple[date, date]] = []
+        extends_run = False
+        # Only trading days are considered, so a weekend doesn't split a run
+        for d in nyse_calendar.trading_days(start, end):
+            if d in series.days:
+                extends_run = False
+                continue
+            if extends_run:
+                runs[-1] = (runs[-1][0], d)
+            else:
+                runs.append((d, d))
+            extends_run = True
+        return runs
+
+    async def get_bars(self, ticker: str, timeframe: str, start: str, end: str) -> List[Dict[str, Any]]:
+        """Bars for [start, end] (inclusive days), newest first like FMP's historical-chart"""
+        self.requests += 1
+        ticker = ticker.upper()
+        first, last = parse_day(start), parse_day(end)
+        if first is None or last is None or first > last:
+            # Not a range the cache understands; pass the request through unchanged
+            return await self._fetch(ticker, timeframe, start, end)
+
+        key = (ticker, timeframe)
+        series = self._series_for(ticker, timeframe)
+        now = datetime.now(NY)
+        cached = 0
+        # Days served from this response but not cached (open session, possibly truncated)
+        uncached: Dict[date, List[Dict[str, Any]]] = {}
+        async with series.lock:
+            runs = self._missing_runs(series, first, last)
+            if not runs:
+                self.fully_cached += 1
+            results = await asyncio.gather(*(
+                self._fetch(ticker, timeframe, a.isoformat(), b.isoformat()) for a, b in runs
+            ))
+            for (a, b), bars in zip(runs, results):
+                by_day: Dict[date, List[Dict[str, Any]]] = {}
+                for bar in bars:
+                    day = parse_day(bar.get("date", ""))
+                    if day is not None and a <= day <= b:
+                        by_day.setdefault(day, []).append(bar)
+                # FMP caps long intraday ranges from the old end, so an empty day is only
+                # trusted (e.g. a halt) when the response reaches back past it
+                earliest = min(by_day) if by_day else None
+                for day in nyse_calendar.trading_days(a, b):
+                    if earliest is not None and day >= earliest and is_closed_day(day, now):
+                        series.days[day] = by_day.get(day, [])
+                        cached += len(series.days[day])
+                    else:
+                        uncached[day] = by_day.get(day, [])
+
+            stitched: List[Dict[str, Any]] = []
+            d = last
+            while d >= first:
+                stitched.extend(uncached.get(d) or series.days.get(d) or [])
+                d -= timedelta(days=1)
+            self._added(key, series, cached)
+        return stitched
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "series": len(self._series),
+            "cached_days": sum(len(s.days) for s in self._series.values()),
+            "cached_bars": self.total_bars,
+            "max_bars": self.max_bars,
+            "requests": self.requests,
+            "fully_cached": self.fully_cached,
+            "fmp_fetches": self.fmp_fetches,
+            "evictions": self.evictions,
+        }
+
+
+# Shared by every /ws/getcustombars connection in this process
+bar_cache = BarCache()
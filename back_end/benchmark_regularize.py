@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+Equivalence check and benchmark for data_downloader.regularize_intraday.
+
+Compares the vectorized implementation against the original per-day loop on
+synthetic gappy intraday bars for every fill mode, then times both. The original
+loop is kept verbatim; regularize_reference() layers the intended behaviour
+changes (session-open grid anchoring, NYSE early-close cutoff) on its output.
+
+    python benchmark_regularize.py --months 36 --freq 5min
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_downloader import ENDPOINT_FOR_FREQ, in_session, parse_session, regularize_intraday
+from market_calendar import nyse_calendar
+
+FILL_MODES = ["ffill_zero_vol", "ffill_only", "drop_missing"]
+
+
+def regularize_intraday_loop(df: pd.DataFrame, pandas_freq: str, session: str,
+                             fill_mode: str = "ffill_zero_vol",
+                             round_decimals: int = 6) -> pd.DataFrame:
+    """Original per-day implementation, kept here as the reference."""
+    all_nan = df[["open","high","low","close","volume"]].isna().all(axis=1)
+    df = df.loc[~all_nan].copy()
+    if df.empty:
+        return df
+
+    df = df.drop_duplicates(subset=["datetime"]).sort_values("datetime").reset_index(drop=True)
+
+    sess = parse_session(session)
+    out_parts = []
+
+    for day, d in df.groupby(df["datetime"].dt.date, sort=True):
+        day_df = d.set_index("datetime")[["open","high","low","close","volume"]].copy()
+        if day_df.empty:
+            continue
+
+        start_ts = day_df.index.min().floor(pandas_freq)
+        end_ts   = day_df.index.max().ceil(pandas_freq)
+        rng = pd.date_range(start_ts, end_ts, freq=pandas_freq)
+        day_df = day_df.reindex(rng)
+
+        if fill_mode == "drop_missing":
+            day_df = day_df.dropna()
+        else:
+            day_df[["open","high","low","close","volume"]] = day_df[["open","high","low","close","volume"]].ffill()
+            lead_mask = day_df["close"].isna()
+            if lead_mask.any():
+                day_df = day_df.loc[~lead_mask]
+            if fill_mode == "ffill_zero_vol":
+                day_df["volume"] = day_df["volume"].fillna(0)
+
+        for c in ["open","high","low","close"]:
+            if c in day_df.columns:
+                day_df[c] = day_df[c].round(round_decimals)
+
+        if sess is not None and not day_df.empty:
+            mask = [in_session(ts, sess) for ts in day_df.index]
+            day_df = day_df.loc[mask]
+
+        if not day_df.empty:
+            day_df = day_df.reset_index().rename(columns={"index": "datetime"})
+            out_parts.append(day_df)
+
+    if not out_parts:
+        return pd.DataFrame(columns=["datetime","open","high","low","close","volume"])
+
+    clean = pd.concat(out_parts, ignore_index=True)
+    clean = clean.sort_values("datetime").reset_index(drop=True)
+    return clean
+
+
+def regularize_reference(df: pd.DataFrame, pandas_freq: str, session: str,
+                         fill_mode: str = "ffill_zero_vol") -> pd.DataFrame:
+    """
+    The baseline loop plus the two intended behaviour changes made since it was
+    written, applied on top of its output rather than inside it:
+
+    1. The grid is anchored on the session open instead of midnight, so 1hour
+       bars sit at 09:30, 10:30, ... (5/15/30min grids are unchanged). This equals
+       running the baseline on timestamps shifted back by the anchor, shifting the
+       result forward again and applying the session filter afterwards.
+    2. On NYSE early-close days, bars after 13:00 are dropped.
+    """
+    sess = parse_session(session)
+    step = pd.Timedelta(pandas_freq)
+    anchor = pd.Timedelta(hours=sess[0], minutes=sess[1]) % step if sess is not None else pd.Timedelta(0)
+    if anchor:
+        shifted = df.assign(datetime=pd.to_datetime(df["datetime"]) - anchor)
+        out = regularize_intraday_loop(shifted, pandas_freq, "all", fill_mode=fill_mode)
+        out["datetime"] = out["datetime"] + anchor
+        out = out.loc[np.array([in_session(ts, sess) for ts in out["datetime"]], dtype=bool)]
+    else:
+        out = regularize_intraday_loop(df, pandas_freq, session, fill_mode=fill_mode)
+    if sess is not None and not out.empty:
+        out = out.loc[~nyse_calendar.after_early_close(out["datetime"])]
+    return out.reset_index(drop=True)
+
+
+def synthetic_bars(months: int, pandas_freq: str, session: str = "0930-1600", seed: int = 0) -> pd.DataFrame:
+    """Gappy extended-hours bars: dropped slots, off-grid prints and partially blank rows."""
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=int(months * 21))
+    step = pd.Timedelta(pandas_freq)
+    per_day = int(pd.Timedelta(hours=12) / step)
+    # Bars land on the grid regularization uses: anchored on the session open
+    # (hourly bars at :30, like FMP's), or on midnight for session 'all'
+    sess = parse_session(session)
+    offset = pd.Timedelta(hours=sess[0], minutes=sess[1]) % step if sess is not None else pd.Timedelta(0)
+
+    stamps = (np.repeat(days.to_numpy() + np.timedelta64(7, "h") + offset.to_timedelta64(), per_day)
+              + np.tile(np.arange(per_day), len(days)) * step.to_timedelta64())
+    stamps = stamps[rng.random(len(stamps)) > 0.15]  # ~15% missing slots
+    jitter = rng.random(len(stamps)) < 0.01  # a few prints off the grid
+    stamps[jitter] += np.timedelta64(60, "s")
+
+    close = 100 + rng.normal(0, 0.2, len(stamps)).cumsum()
+    df = pd.DataFrame({
+        "datetime": stamps,
+        "open": close + rng.normal(0, 0.05, len(stamps)),
+        "high": close + 0.1,
+        "low": close - 0.1,
+        "close": close,
+        "volume": rng.integers(100, 10_000, len(stamps)).astype(float),
+    })
+    blanks = rng.random(len(df)) < 0.01
+    df.loc[blanks, "volume"] = np.nan
+    return df.sample(frac=1.0, random_state=seed).reset_index(drop=True)  # unsorted input
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Check and benchmark vectorized regularize_intraday.")
+    ap.add_argument("--months", type=int, default=36, help="Months of synthetic bars")
+    ap.add_argument("--freq", default="5min", choices=["5min", "15min", "30min", "1hour"])
+    ap.add_argument("--session", default="0930-1600", help="HHMM-HHMM or 'all'")
+    ap.add_argument("--repeat", type=int, default=3, help="Timing repetitions (best of)")
+    args = ap.parse_args()
+
+    _, pandas_freq, _ = ENDPOINT_FOR_FREQ[args.freq]
+    df = synthetic_bars(args.months, pandas_freq, args.session)
+    print(f"{len(df)} synthetic {args.freq} bars over {args.months} months, session={args.session}")
+
+    for mode in FILL_MODES:
+        expected = regularize_reference(df.copy(), pandas_freq, args.session, fill_mode=mode)
+        actual = regularize_intraday(df.copy(), pandas_freq, args.session, fill_mode=mode)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=True)
+        if actual.empty:
+            raise SystemExit(f"{mode}: no rows survived regularization; the check would be vacuous")
+
+        t_loop = _best_of(lambda: regularize_intraday_loop(df.copy(), pandas_freq, args.session, fill_mode=mode), args.repeat)
+        t_vec = _best_of(lambda: regularize_intraday(df.copy(), pandas_freq, args.session, fill_mode=mode), args.repeat)
+        print(f"  {mode:<15} identical ({len(actual)} rows)  loop={t_loop:.3f}s  vectorized={t_vec:.3f}s  "
+              f"speedup={t_loop / t_vec:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
 #!/usr/bin/env python
-import os, sys, time, argparse, random
+import os, sys, argparse, random, json, threading
 from typing import List, Dict, Any, Optional, Tuple
 import datetime as dt
 import pandas as pd
 import numpy as np
-import requests
+
+from market_calendar import nyse_calendar
+from fmp_fetcher import FMP_CALLS_PER_MINUTE, FMP_FETCH_WORKERS, fetch_concurrently, fmp_rate_limiter
+from fmp_budget import BACKFILL, fmp_budget
+from fmp_client import fmp_client
 
 FMT = "%Y-%m-%d %H:%M:%S"
 
@@ -43,11 +47,77 @@ def month_end(d: dt.date) -> dt.date:
     next_m = (d.replace(day=28) + dt.timedelta(days=4)).replace(day=1)
     return next_m - dt.timedelta(days=1)
 
+class ChunkJournal:
+    """
+    Checkpoint journal for resumable backfills.
+    Each fetched month chunk's raw FMP JSON is cached at <cache_dir>/<symbol>/<freq>/<YYYY-MM>.json;
+    closed months (fully in the past) are recorded in <cache_dir>/journal.jsonl once cached, along
+    with symbols whose CSVs were written. With resume=True, journaled chunks are served from disk
+    and finished symbols are skipped, so a re-run after a crash only fetches the missing pieces.
+    """
+    def __init__(self, cache_dir: str, resume: bool = False):
+        self.cache_dir = cache_dir
+        self.resume = resume
+        self.path = os.path.join(cache_dir, "journal.jsonl")
+        self.lock = threading.Lock()
+        self.chunks = set()
+        self.symbols = set()
+        os.makedirs(cache_dir, exist_ok=True)
+        if resume and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    if "month" in entry:
+                        self.chunks.add((entry["symbol"], entry["freq"], entry["month"]))
+                    else:
+                        self.symbols.add((entry["symbol"], entry["freq"]))
+
+    def _chunk_path(self, symbol: str, freq: str, month: str) -> str:
+        return os.path.join(self.cache_dir, symbol, freq, f"{month}.json")
+
+    def _record(self, entry: Dict[str, str]):
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def get_chunk(self, symbol: str, freq: str, month: str) -> Optional[List[Dict[str, Any]]]:
+        if not self.resume or (symbol, freq, month) not in self.chunks:
+            return None
+        try:
+            with open(self._chunk_path(symbol, freq, month), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put_chunk(self, symbol: str, freq: str, month: str, rows: List[Dict[str, Any]], closed: bool):
+        path = self._chunk_path(symbol, freq, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f)
+        os.replace(tmp_path, path)
+        # The current month is still filling in, so only closed months are checkpointed
+        if closed:
+            self.chunks.add((symbol, freq, month))
+            self._record({"symbol": symbol, "freq": freq, "month": month})
+
+    def symbol_done(self, symbol: str, freq: str) -> bool:
+        return self.resume and (symbol, freq) in self.symbols
+
+    def mark_symbol_done(self, symbol: str, freq: str):
+        self.symbols.add((symbol, freq))
+        self._record({"symbol": symbol, "freq": freq})
+
+def _get_json(endpoint: str, params: Dict[str, Any], timeout: int) -> Any:
+    # every bulk call (and retry) waits for a token so concurrent workers stay under the plan limit
+    return fmp_client.get_json(endpoint, params, timeout=timeout, limiter=fmp_rate_limiter, priority=BACKFILL)
+
 def fetch_chunk(endpoint: str, symbol: str, start_d: dt.date, end_d: dt.date, apikey: str, timeout: int = 30) -> List[Dict[str, Any]]:
     params = {"symbol": symbol, "from": start_d.strftime("%Y-%m-%d"), "to": end_d.strftime("%Y-%m-%d"), "apikey": apikey}
-    r = requests.get(endpoint, params=params, timeout=timeout)
-    r.raise_for_status()
-    data = r.json()
+    data = _get_json(endpoint, params, timeout)
 
     # daily endpoint returns a dict with "historical"
     if isinstance(data, dict) and "historical" in data and isinstance(data["historical"], list):
@@ -61,11 +131,14 @@ def fetch_chunk(endpoint: str, symbol: str, start_d: dt.date, end_d: dt.date, ap
         raise RuntimeError(f"Unexpected FMP response type: {type(data)}; content head: {str(data)[:200]}")
     return data
 
-def fetch_all(endpoint: str, symbol: str, apikey: str, max_months: int, is_daily: bool, pause_s: float = 0.2) -> pd.DataFrame:
+def fetch_all(endpoint: str, symbol: str, apikey: str, max_months: int, is_daily: bool,
+              freq: Optional[str] = None, journal: Optional[ChunkJournal] = None) -> pd.DataFrame:
     """
     Fetch history; returns ascending df with datetime, open, high, low, close, volume.
     - Intraday endpoints: page month-by-month (FMP’s intraday limits).
     - Daily endpoint: one call using from/to (span ~max_months months).
+    Pacing comes from the shared token bucket in fmp_fetcher, not fixed sleeps.
+    With a journal (and freq), intraday month chunks are cached and checkpointed.
     """
     today = dt.date.today()
 
@@ -84,7 +157,12 @@ def fetch_all(endpoint: str, symbol: str, apikey: str, max_months: int, is_daily
         rows: List[Dict[str, Any]] = []
         months = 0
         while months < max_months:
-            chunk = fetch_chunk(endpoint, symbol, start, end, apikey)
+            month_key = start.strftime("%Y-%m")
+            chunk = journal.get_chunk(symbol, freq, month_key) if journal and freq else None
+            if chunk is None:
+                chunk = fetch_chunk(endpoint, symbol, start, end, apikey)
+                if journal and freq:
+                    journal.put_chunk(symbol, freq, month_key, chunk, closed=end < today)
             if chunk:
                 rows.extend(chunk)
             else:
@@ -92,7 +170,6 @@ def fetch_all(endpoint: str, symbol: str, apikey: str, max_months: int, is_daily
             end = start - dt.timedelta(days=1)
             start = month_start(end)
             months += 1
-            time.sleep(pause_s)
         if not rows:
             raise RuntimeError(f"No intraday data returned for {symbol}. Check plan or try smaller windows.")
 
@@ -158,7 +235,8 @@ def regularize_intraday(df: pd.DataFrame, pandas_freq: str, session: str,
         return out
 
     # drop rows where all OHLCV are NaN/blank
-    all_nan = df[["open","high","low","close","volume"]].isna().all(axis=1)
+    cols = ["open","high","low","close","volume"]
+    all_nan = df[cols].isna().all(axis=1)
     df = df.loc[~all_nan].copy()
     if df.empty:
         return df
@@ -167,57 +245,127 @@ def regularize_intraday(df: pd.DataFrame, pandas_freq: str, session: str,
     df = df.drop_duplicates(subset=["datetime"]).sort_values("datetime").reset_index(drop=True)
 
     sess = parse_session(session)
-    out_parts = []
-
-    for day, d in df.groupby(df["datetime"].dt.date, sort=True):
-        day_df = d.set_index("datetime")[["open","high","low","close","volume"]].copy()
-        if day_df.empty:
-            continue
-
-        start_ts = day_df.index.min().floor(pandas_freq)
-        end_ts   = day_df.index.max().ceil(pandas_freq)
-        rng = pd.date_range(start_ts, end_ts, freq=pandas_freq)
-        day_df = day_df.reindex(rng)
-
-        if fill_mode == "drop_missing":
-            day_df = day_df.dropna()
-        else:
-            # within-day forward fill
-            day_df[["open","high","low","close","volume"]] = day_df[["open","high","low","close","volume"]].ffill()
-            # drop leading rows before first print
-            lead_mask = day_df["close"].isna()
-            if lead_mask.any():
-                day_df = day_df.loc[~lead_mask]
-            if fill_mode == "ffill_zero_vol":
-                day_df["volume"] = day_df["volume"].fillna(0)
-
-        for c in ["open","high","low","close"]:
-            if c in day_df.columns:
-                day_df[c] = day_df[c].round(round_decimals)
-
-        # session filter
-        if sess is not None and not day_df.empty:
-            mask = [in_session(ts, sess) for ts in day_df.index]
-            day_df = day_df.loc[mask]
-
-        if not day_df.empty:
-            day_df = day_df.reset_index().rename(columns={"index": "datetime"})
-            out_parts.append(day_df)
-
-    if not out_parts:
+    step = pd.Timedelta(pandas_freq)
+
+    # Per-day grid bounds: [floor(first print), ceil(last print)] at pandas_freq,
+    # anchored on the session open so e.g. 60min slots land on :30 like the bars do
+    day = df["datetime"].dt.normalize()
+    bounds = df.groupby(day, sort=True)["datetime"].agg(["min", "max"])
+    anchor = pd.Timedelta(hours=sess[0], minutes=sess[1]) % step if sess is not None else pd.Timedelta(0)
+    origin = bounds.index.to_series() + anchor
+    starts = origin + ((bounds["min"] - origin) // step) * step
+    ends = origin - ((origin - bounds["max"]) // step) * step
+    counts = (((ends - starts) // step) + 1).to_numpy(dtype="int64")
+
+    # Lay every day's grid end to end in one array instead of reindexing day by day
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    grid = pd.DataFrame({
+        "day": np.repeat(bounds.index.to_numpy(), counts),
+        "datetime": np.repeat(starts.to_numpy(), counts) + offsets * step.to_timedelta64(),
+    })
+    bars = df[["datetime"] + cols].assign(day=day)
+    # (day, datetime) join: a grid slot only picks up prints from its own day, like a per-day reindex
+    out = grid.merge(bars, on=["day", "datetime"], how="left")
+
+    if fill_mode == "drop_missing":
+        out = out.dropna(subset=cols)
+    else:
+        # within-day forward fill
+        out[cols] = out.groupby("day", sort=False)[cols].ffill()
+        # drop leading rows before first print
+        out = out.loc[out["close"].notna()]
+        if fill_mode == "ffill_zero_vol":
+            out["volume"] = out["volume"].fillna(0)
+
+    for c in ["open","high","low","close"]:
+        out[c] = out[c].round(round_decimals)
+
+    # session filter on time of day (inclusive on both ends); on NYSE half-days the
+    # session ends at 13:00, so no slots are synthesized after the early close
+    if sess is not None and not out.empty:
+        s_h, s_m, e_h, e_m = sess
+        tod = out["datetime"] - out["datetime"].dt.normalize()
+        in_sess = (tod >= pd.Timedelta(hours=s_h, minutes=s_m)) & (tod <= pd.Timedelta(hours=e_h, minutes=e_m))
+        in_sess &= ~nyse_calendar.after_early_close(out["datetime"])
+        out = out.loc[in_sess]
+
+    if out.empty:
         return pd.DataFrame(columns=["datetime","open","high","low","close","volume"])
 
-    clean = pd.concat(out_parts, ignore_index=True)
-    clean = clean.sort_values("datetime").reset_index(drop=True)
+    clean = out[["datetime"] + cols].sort_values("datetime").reset_index(drop=True)
     return clean
 
+def resample_bars(df: pd.DataFrame, pandas_freq: str, session: str = "0930-1600") -> pd.DataFrame:
+    """
+    Aggregate finer raw bars (e.g. 5min) into coarser `pandas_freq` bars.
+    Bars are labeled by their start time like FMP's, and bins are anchored on the session
+    open, so 1-hour bars run 09:30, 10:30, ... rather than on the clock hour.
+    OHLCV aggregation: first open, max high, min low, last close, summed volume.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=["datetime","open","high","low","close","volume"])
+
+    sess = parse_session(session)
+    step = pd.Timedelta(pandas_freq)
+    anchor = pd.Timedelta(hours=sess[0], minutes=sess[1]) if sess is not None else pd.Timedelta(0)
+    offset = anchor % step
+
+    df = df.drop_duplicates(subset=["datetime"]).sort_values("datetime")
+    bucket = (df["datetime"] - offset).dt.floor(pandas_freq) + offset
+    out = df.groupby(bucket, sort=True).agg(
+        open=("open", "first"), high=("high", "max"), low=("low", "min"),
+        close=("close", "last"), volume=("volume", "sum"),
+    )
+    out = out.dropna(subset=["close"])
+    return out.rename_axis("datetime").reset_index()
+
+def compare_bars(derived: pd.DataFrame, native: pd.DataFrame, rel_tol: float = 1e-4) -> Dict[str, Any]:
+    """Compare derived bars with FMP's native bars on their common timestamps."""
+    merged = derived.merge(native, on="datetime", how="outer", suffixes=("_derived", "_native"), indicator=True)
+    both = merged[merged["_merge"] == "both"]
+    report: Dict[str, Any] = {
+        "matched": int(len(both)),
+        "only_derived": int((merged["_merge"] == "left_only").sum()),
+        "only_native": int((merged["_merge"] == "right_only").sum()),
+    }
+    for c in ["open","high","low","close","volume"]:
+        a = both[f"{c}_derived"].astype(float)
+        b = both[f"{c}_native"].astype(float)
+        diff = (a - b).abs()
+        report[f"{c}_mismatches"] = int((diff > rel_tol * b.abs().clip(lower=1.0)).sum())
+        report[f"{c}_max_abs_diff"] = float(diff.max()) if len(diff) else 0.0
+    return report
+
+def verify_derived(symbols: List[str], freq: str, apikey: str, days: int = 5,
+                   session: str = "0930-1600") -> Dict[str, Dict[str, Any]]:
+    """Fetch 5min and native `freq` bars for a sample of symbols and compare derived vs native."""
+    endpoint_5m, _, _ = ENDPOINT_FOR_FREQ["5min"]
+    endpoint_native, pandas_freq, _ = ENDPOINT_FOR_FREQ[freq]
+    end_d = dt.date.today()
+    start_d = end_d - dt.timedelta(days=days)
+
+    def as_frame(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+        df = pd.DataFrame(rows).rename(columns={"date": "datetime"})
+        if df.empty:
+            return pd.DataFrame(columns=["datetime","open","high","low","close","volume"])
+        df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce")
+        return df[["datetime","open","high","low","close","volume"]].dropna(subset=["datetime"])
+
+    reports = {}
+    for sym in symbols:
+        five = as_frame(fetch_chunk(endpoint_5m, sym, start_d, end_d, apikey))
+        native = as_frame(fetch_chunk(endpoint_native, sym, start_d, end_d, apikey))
+        derived = resample_bars(five, pandas_freq, session=session)
+        # Compare completed sessions only: today's newest bin may still be filling
+        cutoff = pd.Timestamp(end_d)
+        reports[sym] = compare_bars(derived[derived["datetime"] < cutoff], native[native["datetime"] < cutoff])
+    return reports
+
 def fetch_sp500_symbols(apikey: str) -> List[str]:
     errors = []
     for url in SP500_ENDPOINTS:
         try:
-            r = requests.get(url, params={"apikey": apikey}, timeout=30)
-            r.raise_for_status()
-            data = r.json()
+            data = fmp_client.get_json(url, {"apikey": apikey}, timeout=30, priority=BACKFILL)
             if isinstance(data, dict) and "constituents" in data:
                 syms = [row.get("symbol") for row in data["constituents"]]
             elif isinstance(data, list):
@@ -251,9 +399,22 @@ def main():
     ap.add_argument("--session", default="0930-1600", help="HHMM-HHMM or 'all' (ignored for 1day)")
     ap.add_argument("--fill", choices=["ffill_zero_vol","ffill_only","drop_missing"], default="ffill_zero_vol")
     ap.add_argument("--round", type=int, default=6, help="Decimals for price rounding")
-    ap.add_argument("--out_raw", required=True, help="Folder to write raw CSVs")
-    ap.add_argument("--out_clean", required=True, help="Folder to write cleaned CSVs")
+    ap.add_argument("--out_raw", help="Folder to write raw CSVs")
+    ap.add_argument("--out_clean", help="Folder to write cleaned CSVs")
+    ap.add_argument("--verify_derived", action="store_true",
+                    help="Instead of downloading, compare --freq bars derived from 5min with FMP's native bars")
+    ap.add_argument("--verify_days", type=int, default=5, help="Days of bars compared by --verify_derived")
+    ap.add_argument("--cache_dir", default=None,
+                    help="Folder for raw chunk JSON and the checkpoint journal (default: <out_raw>/.chunks)")
+    ap.add_argument("--resume", action="store_true",
+                    help="Skip chunks and symbols already recorded in the checkpoint journal")
+    ap.add_argument("--workers", type=int, default=FMP_FETCH_WORKERS, help="Symbols fetched concurrently")
+    ap.add_argument("--calls_per_minute", type=int, default=FMP_CALLS_PER_MINUTE,
+                    help="FMP plan rate ceiling shared by all workers")
     args = ap.parse_args()
+    fmp_rate_limiter.set_rate(args.calls_per_minute)
+    # Run standalone there is no interactive traffic to leave room for
+    fmp_budget.set_limit(args.calls_per_minute, {BACKFILL: 1.0})
 
     if not args.apikey:
         print("ERROR: provide FMP API key via --apikey or env FMP_API_KEY", file=sys.stderr)
@@ -274,22 +435,40 @@ def main():
     if args.max_symbols and args.max_symbols > 0:
         symbols = symbols[:args.max_symbols]
 
+    if args.verify_derived:
+        if args.freq in ("5min", "1day"):
+            print("ERROR: --verify_derived needs --freq 15min, 30min or 1hour", file=sys.stderr)
+            sys.exit(2)
+        reports = verify_derived(symbols, args.freq, args.apikey, days=args.verify_days, session=args.session)
+        for sym, report in reports.items():
+            print(f"{sym}: {report}")
+        return
+
+    if not args.out_raw or not args.out_clean:
+        print("ERROR: provide --out_raw and --out_clean", file=sys.stderr)
+        sys.exit(2)
+
     endpoint, pandas_freq, is_daily = ENDPOINT_FOR_FREQ[args.freq]
     # For 1day we ignore session
     effective_session = "all" if is_daily else args.session
 
     os.makedirs(args.out_raw, exist_ok=True)
     os.makedirs(args.out_clean, exist_ok=True)
+    journal = ChunkJournal(args.cache_dir or os.path.join(args.out_raw, ".chunks"), resume=args.resume)
 
-    for i, sym in enumerate(symbols, 1):
+    def process_symbol(item: Tuple[int, str]):
+        i, sym = item
+        if journal.symbol_done(sym, args.freq):
+            print(f"[{i}/{len(symbols)}] {sym}: already complete, skipping (--resume)")
+            return
         try:
             print(f"[{i}/{len(symbols)}] {sym}: fetching {args.freq} JSON...")
-            df_raw = fetch_all(endpoint, sym, args.apikey, max_months=args.max_months, is_daily=is_daily)
+            df_raw = fetch_all(endpoint, sym, args.apikey, max_months=args.max_months, is_daily=is_daily,
+                               freq=args.freq, journal=journal)
             raw_csv = os.path.join(args.out_raw, f"{sym}_{args.freq}.csv")
             df_raw.to_csv(raw_csv, index=False)
-            print(f"    wrote raw:   {raw_csv}  ({len(df_raw)} rows)")
+            print(f"    {sym} wrote raw:   {raw_csv}  ({len(df_raw)} rows)")
 
-            print(f"    regularizing -> pandas_freq={pandas_freq}, session={effective_session}, fill={args.fill}")
             clean = regularize_intraday(
                 df_raw[["datetime","open","high","low","close","volume"]].copy(),
                 pandas_freq=pandas_freq, session=effective_session,
@@ -297,14 +476,15 @@ def main():
             )
             clean_csv = os.path.join(args.out_clean, f"{sym}_{args.freq}_clean.csv")
             clean.to_csv(clean_csv, index=False)
-            print(f"    wrote clean: {clean_csv}  ({len(clean)} rows)")
-            # gentle pacing
-            if (i % 10) == 0:
-                time.sleep(0.5)
-            else:
-                time.sleep(0.2)
+            print(f"    {sym} wrote clean: {clean_csv}  ({len(clean)} rows)")
+            journal.mark_symbol_done(sym, args.freq)
         except Exception as e:
             print(f"    WARN: {sym} failed: {e}")
 
+    print(f"regularizing -> pandas_freq={pandas_freq}, session={effective_session}, fill={args.fill}; "
+          f"{args.workers} workers at {args.calls_per_minute} calls/min")
+    fetch_concurrently(process_symbol, enumerate(symbols, 1), max_workers=args.workers)
+    print(f"done: {fmp_rate_limiter.stats()}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
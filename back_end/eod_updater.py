@@ -18,20 +18,32 @@ AI_MODEL_DIR = ROOT_DIR / "AI_model"
 if str(AI_MODEL_DIR) not in sys.path:
     sys.path.insert(0, str(AI_MODEL_DIR))
 
-from data_downloader import ENDPOINT_FOR_FREQ, fetch_all, regularize_intraday  # type: ignore
+from data_downloader import ENDPOINT_FOR_FREQ, fetch_all, regularize_intraday, resample_bars  # type: ignore
+from parquet_store import ParquetBarStore
+from market_calendar import nyse_calendar
+from fmp_fetcher import FMP_FETCH_WORKERS, fetch_concurrently, fmp_rate_limiter
+
+SESSION = "0930-1600"
+# Frequencies built from the stored 5min bars instead of separate FMP downloads
+DERIVED_FREQS = ["15min", "30min", "1hour"]
 
 
 class EndOfDayUpdater:
     """
     Background service that, after U.S. market close (16:00 America/New_York),
-    updates 5m and 15m datasets for configured tickers and writes both CSV and Excel.
+    updates 5m datasets for configured tickers in a partitioned Parquet store and derives
+    15m, 30m and 1h bars from them (set EOD_DERIVE_FROM_5MIN=0 to download 15m natively).
+    Excel exports are produced on demand via export_excel().
     """
 
     def __init__(self, tickers: Optional[List[str]] = None):
         self.tickers = tickers or self._load_ticker_list()
         self.is_running = False
         self.thread: Optional[threading.Thread] = None
-        # Output folders under AI_model
+        # Partitioned columnar store: AI_model/barstore/<raw|clean>/<symbol>/<freq>/<YYYY-MM>.parquet
+        self.store = ParquetBarStore(AI_MODEL_DIR / "barstore")
+        # Legacy CSV folders under AI_model (migrated into the store on first update,
+        # and the destination for on-demand Excel exports)
         self.base_5m_raw = AI_MODEL_DIR / "5minutecharts" / "raw"
         self.base_5m_clean = AI_MODEL_DIR / "5minutecharts" / "clean"
         self.base_15m_raw = AI_MODEL_DIR / "15minutecharts" / "raw"
@@ -41,6 +53,10 @@ class EndOfDayUpdater:
 
         # FMP API key
         self.fmp_api_key = os.getenv("FMP_API_KEY", "")
+        # Symbols fetched concurrently per frequency
+        self.fetch_workers = FMP_FETCH_WORKERS
+        # Build 15m/30m/1h from 5m rather than downloading them
+        self.derive_from_5min = os.getenv("EOD_DERIVE_FROM_5MIN", "1") != "0"
 
         # Last run time to debounce manual triggers
         self._last_run_at: Optional[datetime] = None
@@ -65,54 +81,59 @@ class EndOfDayUpdater:
         return datetime.now(ZoneInfo("America/New_York"))
 
     def _next_market_close_run(self, after: Optional[datetime] = None) -> datetime:
+        """Next run time: 10 minutes after the close (16:00, or 13:00 on half-days) of a trading day"""
         now_ny = after or self._now_ny()
-        close_today = now_ny.replace(hour=16, minute=10, second=0, microsecond=0)
-        # Run at 16:10 NY time to allow feeds to settle
-        if now_ny <= close_today:
-            return close_today
-        # Otherwise schedule for next weekday (skip Sat/Sun)
-        next_day = (now_ny + timedelta(days=1)).replace(hour=16, minute=10, second=0, microsecond=0)
-        while next_day.weekday() >= 5:  # 5=Sat, 6=Sun
-            next_day += timedelta(days=1)
-        return next_day
-
-    def _write_outputs(self, df_raw: pd.DataFrame, clean: pd.DataFrame, symbol: str, freq: str, raw_dir: Path, clean_dir: Path):
-        raw_csv = raw_dir / f"{symbol}_{freq}.csv"
-        clean_csv = clean_dir / f"{symbol}_{freq}_clean.csv"
+        day = now_ny.date()
+        while True:
+            close = nyse_calendar.session_close(day)
+            if close is not None:
+                # Run 10 minutes after the close to allow feeds to settle
+                run_at = datetime.combine(day, close, tzinfo=now_ny.tzinfo) + timedelta(minutes=10)
+                if now_ny <= run_at:
+                    return run_at
+            # Weekends and exchange holidays are skipped entirely
+            day += timedelta(days=1)
+
+    def _legacy_dirs(self, freq: str):
+        if freq == "5min":
+            return self.base_5m_raw, self.base_5m_clean
+        if freq == "15min":
+            return self.base_15m_raw, self.base_15m_clean
+        return None, None
+
+    def _migrate_legacy_csv(self, symbol: str, freq: str):
+        """One-time import of a symbol's legacy CSVs into the Parquet store"""
+        if self.store.has_series("raw", symbol, freq):
+            return
+        raw_dir, clean_dir = self._legacy_dirs(freq)
+        if raw_dir is None:
+            return
+        for kind, path in [("raw", raw_dir / f"{symbol}_{freq}.csv"),
+                           ("clean", clean_dir / f"{symbol}_{freq}_clean.csv")]:
+            if path.exists():
+                legacy = pd.read_csv(path, parse_dates=["datetime"])
+                self.store.append(kind, symbol, freq, legacy)
+                print(f"Migrated {path.name} into Parquet store ({len(legacy)} rows)")
+
+    def export_excel(self, symbol: str, freq: str) -> dict:
+        """On-demand Excel export of a symbol's raw and clean series (not part of the nightly run)"""
+        raw_dir, clean_dir = self._legacy_dirs(freq)
+        if raw_dir is None:
+            raise ValueError(f"Unsupported frequency for export: {freq}")
         raw_xlsx = raw_dir / f"{symbol}_{freq}.xlsx"
         clean_xlsx = clean_dir / f"{symbol}_{freq}_clean.xlsx"
-
-        df_raw.to_csv(raw_csv, index=False)
-        clean.to_csv(clean_csv, index=False)
-        try:
-            df_raw.to_excel(raw_xlsx, index=False)
-            clean.to_excel(clean_xlsx, index=False)
-        except Exception:
-            # Excel export is best-effort; CSVs are primary artifacts
-            pass
+        return {
+            "raw": {"path": str(raw_xlsx), "rows": self.store.export_excel("raw", symbol, freq, raw_xlsx)},
+            "clean": {"path": str(clean_xlsx), "rows": self.store.export_excel("clean", symbol, freq, clean_xlsx)},
+        }
 
     def _get_last_trading_day(self, symbol: str, freq: str) -> Optional[datetime]:
-        """Get the last trading day we have data for a symbol"""
+        """Get the last trading day we have data for a symbol (from the store manifest)"""
         try:
-            if freq == "5min":
-                clean_file = self.base_5m_clean / f"{symbol}_{freq}_clean.csv"
-            elif freq == "15min":
-                clean_file = self.base_15m_clean / f"{symbol}_{freq}_clean.csv"
-            else:
-                return None
-                
-            if not clean_file.exists():
-                return None
-                
-            # Read the last few lines to get the most recent date
-            df = pd.read_csv(clean_file)
-            if df.empty:
+            if freq not in ("5min", "15min"):
                 return None
-                
-            # Get the last datetime from the clean data
-            last_dt = pd.to_datetime(df['datetime'].iloc[-1])
-            return last_dt
-            
+            self._migrate_legacy_csv(symbol, freq)
+            return self.store.last_timestamp("clean", symbol, freq)
         except Exception:
             return None
 
@@ -134,6 +155,9 @@ class EndOfDayUpdater:
             # Skip if start_date is in the future
             if start_date > end_date:
                 return None
+            # No session since the last stored day (weekend/holiday): nothing to ask FMP for
+            if not nyse_calendar.trading_days(start_date, end_date):
+                return None
                 
             # For intraday data, fetch month by month to respect FMP limits
             if not is_daily:
@@ -167,9 +191,9 @@ class EndOfDayUpdater:
             
             try:
                 chunk = fetch_chunk(endpoint, symbol, month_start, month_end, self.fmp_api_key)
+                # Pacing and retries happen inside fetch_chunk (shared token bucket)
                 if chunk:
                     all_data.extend(chunk)
-                time.sleep(0.2)  # Rate limiting
             except Exception as e:
                 print(f"Error fetching chunk for {symbol} {month_start} to {month_end}: {e}")
             
@@ -213,88 +237,103 @@ class EndOfDayUpdater:
             return None
 
     def _append_to_existing_data(self, new_df: pd.DataFrame, symbol: str, freq: str):
-        """Append new data to existing files, avoiding duplicates"""
+        """Append new data to the store, rewriting only the partitions it touches"""
         try:
-            if freq == "5min":
-                raw_file = self.base_5m_raw / f"{symbol}_{freq}.csv"
-                clean_file = self.base_5m_clean / f"{symbol}_{freq}_clean.csv"
-            elif freq == "15min":
-                raw_file = self.base_15m_raw / f"{symbol}_{freq}.csv"
-                clean_file = self.base_15m_clean / f"{symbol}_{freq}_clean.csv"
-            else:
+            if freq not in ("5min", "15min"):
                 return
-                
-            # Read existing data
-            existing_raw = pd.DataFrame()
-            existing_clean = pd.DataFrame()
-            
-            if raw_file.exists():
-                existing_raw = pd.read_csv(raw_file)
-                existing_raw['datetime'] = pd.to_datetime(existing_raw['datetime'])
-            if clean_file.exists():
-                existing_clean = pd.read_csv(clean_file)
-                existing_clean['datetime'] = pd.to_datetime(existing_clean['datetime'])
-            
-            # Combine and remove duplicates
-            if not existing_raw.empty:
-                combined_raw = pd.concat([existing_raw, new_df], ignore_index=True)
-                combined_raw = combined_raw.drop_duplicates(subset=['datetime']).sort_values('datetime')
-            else:
-                combined_raw = new_df
-                
-            # Regularize the combined data
+            self._migrate_legacy_csv(symbol, freq)
+
+            self.store.append("raw", symbol, freq, new_df)
+
+            # Regularization is day-scoped, so only the days in new_df need rebuilding
+            first_day = new_df["datetime"].min().normalize()
+            day_raw = self.store.read("raw", symbol, freq, start=first_day)
+
             endpoint, pandas_freq, is_daily = ENDPOINT_FOR_FREQ[freq]
-            session = "all" if is_daily else "0930-1600"
+            session = "all" if is_daily else SESSION
             
             clean = regularize_intraday(
-                combined_raw[["datetime", "open", "high", "low", "close", "volume"]].copy(),
+                day_raw[["datetime", "open", "high", "low", "close", "volume"]].copy(),
                 pandas_freq=pandas_freq,
                 session=session,
                 fill_mode="ffill_zero_vol",
                 round_decimals=6,
             )
+            self.store.append("clean", symbol, freq, clean)
+                
+        except Exception as e:
+            print(f"Error appending data for {symbol} {freq}: {e}")
+
+    def _derive_from_5min(self, symbol: str, since: pd.Timestamp):
+        """Rebuild DERIVED_FREQS bars from stored 5min bars for the days since `since`"""
+        # A derived series that doesn't exist yet is built from the full 5min history
+        starts = {}
+        for freq in DERIVED_FREQS:
+            self._migrate_legacy_csv(symbol, freq)
+            starts[freq] = since.normalize() if self.store.has_series("raw", symbol, freq) else None
+        read_from = None if any(v is None for v in starts.values()) else min(starts.values())
+        five = self.store.read("raw", symbol, "5min", start=read_from)
+
+        for freq in DERIVED_FREQS:
+            _, pandas_freq, _ = ENDPOINT_FOR_FREQ[freq]
+            source = five if starts[freq] is None else five[five["datetime"] >= starts[freq]]
+            derived = resample_bars(source, pandas_freq, session=SESSION)
+            if derived.empty:
+                continue
+            self.store.append("raw", symbol, freq, derived)
+            clean = regularize_intraday(
+                derived.copy(),
+                pandas_freq=pandas_freq,
+                session=SESSION,
+                fill_mode="ffill_zero_vol",
+                round_decimals=6,
+            )
+            self.store.append("clean", symbol, freq, clean)
+
+    def _update_symbol(self, sym: str, freq: str, i: int, total: int):
+        """Fetch and store only the missing data for one symbol"""
+        try:
+            print(f"[{i}/{total}] Processing {sym} for {freq}...")
+            # Check what's the last trading day we have
+            last_trading_day = self._get_last_trading_day(sym, freq)
             
-            # Write updated files
-            combined_raw.to_csv(raw_file, index=False)
-            clean.to_csv(clean_file, index=False)
+            # Fetch only new data since last trading day
+            new_data = self._fetch_incremental_data(sym, freq, last_trading_day)
             
-            # Also write Excel versions
-            try:
-                combined_raw.to_excel(raw_file.with_suffix('.xlsx'), index=False)
-                clean.to_excel(clean_file.with_suffix('.xlsx'), index=False)
-            except Exception:
-                pass  # Excel export is best-effort
+            if new_data is not None and not new_data.empty:
+                # Append to existing data
+                self._append_to_existing_data(new_data, sym, freq)
+                if freq == "5min" and self.derive_from_5min:
+                    self._derive_from_5min(sym, new_data["datetime"].min())
+                print(f"✓ Updated {sym} {freq}: added {len(new_data)} new records")
+            else:
+                print(f"✓ No new data for {sym} {freq}")
                 
         except Exception as e:
-            print(f"Error appending data for {symbol} {freq}: {e}")
+            print(f"✗ Error updating {sym} {freq}: {e}")
 
     def _update_for_freq(self, symbols: List[str], freq: str, max_months: int = 36):
-        """Update data for each symbol, fetching only missing data"""
+        """Update data for each symbol on a bounded worker pool, fetching only missing data"""
         print(f"Updating {len(symbols)} symbols for {freq} frequency...")
-        for i, sym in enumerate(symbols, 1):
-            try:
-                print(f"[{i}/{len(symbols)}] Processing {sym} for {freq}...")
-                # Check what's the last trading day we have
-                last_trading_day = self._get_last_trading_day(sym, freq)
-                
-                # Fetch only new data since last trading day
-                new_data = self._fetch_incremental_data(sym, freq, last_trading_day)
-                
-                if new_data is not None and not new_data.empty:
-                    # Append to existing data
-                    self._append_to_existing_data(new_data, sym, freq)
-                    print(f"✓ Updated {sym} {freq}: added {len(new_data)} new records")
-                else:
-                    print(f"✓ No new data for {sym} {freq}")
-                    
-            except Exception as e:
-                print(f"✗ Error updating {sym} {freq}: {e}")
-                continue
+        fetch_concurrently(
+            lambda item: self._update_symbol(item[1], freq, item[0], len(symbols)),
+            enumerate(symbols, 1),
+            max_workers=self.fetch_workers,
+        )
 
     def run_once(self, tickers: Optional[List[str]] = None):
+        holiday = nyse_calendar.holiday_name(self._now_ny().date())
+        if holiday:
+            # Symbols that are behind still catch up; up-to-date ones make no API calls
+            print(f"Market closed today ({holiday}); only backfilling missed sessions")
         symbols = [s.strip().upper().replace(".", "-") for s in (tickers or self.tickers)]
-        self._update_for_freq(symbols, "5min")
-        self._update_for_freq(symbols, "15min")
+        if self.derive_from_5min:
+            # One download per symbol; 15m/30m/1h are resampled from the new 5m bars
+            self._update_for_freq(symbols, "5min")
+        else:
+            # Both frequencies run in parallel; the shared token bucket keeps the
+            # combined request rate under the FMP plan ceiling
+            fetch_concurrently(lambda freq: self._update_for_freq(symbols, freq), ["5min", "15min"], max_workers=2)
         self._last_run_at = datetime.utcnow()
 
     def update_all_stocks(self):
@@ -334,12 +373,17 @@ class EndOfDayUpdater:
         if self.thread:
             self.thread.join(timeout=10)
 
+    def dataset_summary(self) -> dict:
+        """Per-series row counts and time ranges, read from the store manifest"""
+        return self.store.summary()
+
     def status(self) -> dict:
         return {
             "is_running": self.is_running,
             "ticker_count": len(self.tickers),
             "tickers": self.tickers[:10] if len(self.tickers) > 10 else self.tickers,  # Show first 10 for brevity
             "last_run_at": self._last_run_at,
+            "rate_limiter": fmp_rate_limiter.stats(),
         }
 
 
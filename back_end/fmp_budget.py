@@ -0,0 +1,277 @@
+"""
+Process-wide FMP call budget and circuit breaker, enforced inside fmp_client.
+
+Budget: every FMP call (including retries) takes a slot from a 60-second sliding
+window sized to FMP_CALLS_PER_MINUTE. Callers declare a priority. Interactive
+traffic may use the whole window. The prediction loop stops at
+FMP_BUDGET_PREDICTION_SHARE of it, and backfill (nightly EOD updates, bulk
+downloads, listing refreshes) stops at FMP_BUDGET_BACKFILL_SHARE. Lower
+priorities therefore queue up before user requests ever hit the plan limit.
+Background callers wait for a slot. Interactive callers wait at most
+FMP_INTERACTIVE_MAX_WAIT seconds before failing with FMPUnavailable.
+
+Circuit breaker: one per endpoint family, so a failing bulk endpoint (e.g. a
+historical-chart backfill timing out) doesn't cut off quotes and profiles.
+FMP_BREAKER_THRESHOLD consecutive transient failures (connection errors,
+timeouts, 429, 5xx) open a family's circuit. For FMP_BREAKER_RESET_SECONDS its
+calls fail fast, then a single probe call decides whether it closes again. While FMP is unavailable, fmp_client answers from the
+last good response for the same request when it has one (see StaleResponses).
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Dict, Optional, Tuple
+
+from fmp_fetcher import FMP_CALLS_PER_MINUTE, FMPUnavailable
+from ttl_cache import LRUTTLCache
+
+INTERACTIVE = "interactive"
+PREDICTION = "prediction"
+BACKFILL = "backfill"
+
+FMP_BUDGET_SHARES = {
+    INTERACTIVE: 1.0,
+    PREDICTION: float(os.getenv("FMP_BUDGET_PREDICTION_SHARE", "0.85")),
+    BACKFILL: float(os.getenv("FMP_BUDGET_BACKFILL_SHARE", "0.6")),
+}
+FMP_INTERACTIVE_MAX_WAIT = float(os.getenv("FMP_INTERACTIVE_MAX_WAIT", "2"))
+FMP_BREAKER_THRESHOLD = int(os.getenv("FMP_BREAKER_THRESHOLD", "5"))
+FMP_BREAKER_RESET_SECONDS = float(os.getenv("FMP_BREAKER_RESET_SECONDS", "30"))
+# How old a response may be and still be served while FMP is unavailable
+FMP_STALE_MAX_AGE = int(os.getenv("FMP_STALE_MAX_AGE", str(60 * 60 * 24)))
+# Bulk history and listings are too large to keep around just in case
+STALE_EXCLUDED_FAMILIES = {"historical", "stock"}
+
+WINDOW_SECONDS = 60.0
+
+
+def endpoint_family(endpoint: str) -> str:
+    """Collapse related endpoints, e.g. historical-chart/historical-price-full -> historical"""
+    if endpoint.startswith("historical"):
+        return "historical"
+    if endpoint in ("quote", "quotes", "quote-short"):
+        return "quote"
+    return endpoint
+
+
+class FMPBudget:
+    def __init__(self, calls_per_minute: int = FMP_CALLS_PER_MINUTE):
+        self.calls_per_minute = calls_per_minute
+        self.shares = dict(FMP_BUDGET_SHARES)
+        self._calls: deque = deque()
+        self._lock = threading.Lock()
+        self.by_family: Counter = Counter()
+        self.by_priority: Counter = Counter()
+        self.waits: Counter = Counter()
+        self.rejected: Counter = Counter()
+
+    def set_limit(self, calls_per_minute: int, shares: Optional[Dict[str, float]] = None):
+        with self._lock:
+            self.calls_per_minute = calls_per_minute
+            self.shares.update(shares or {})
+
+    def _cap(self, priority: str) -> int:
+        return max(1, int(self.calls_per_minute * self.shares.get(priority, 1.0)))
+
+    def _try_take(self, priority: str, family: str) -> float:
+        """Take a slot and return 0, or return the seconds until one frees up"""
+        with self._lock:
+            now = time.monotonic()
+            while self._calls and self._calls[0] <= now - WINDOW_SECONDS:
+                self._calls.popleft()
+            cap = self._cap(priority)
+            if len(self._calls) < cap:
+                self._calls.append(now)
+                self.by_family[family] += 1
+                self.by_priority[priority] += 1
+                return 0.0
+            # The call that has to expire before this priority fits under its cap
+            return self._calls[len(self._calls) - cap] + WINDOW_SECONDS - now
+
+    def _max_wait(self, priority: str, max_wait: Optional[float]) -> float:
+        if max_wait is not None:
+            return max_wait
+        return FMP_INTERACTIVE_MAX_WAIT if priority == INTERACTIVE else float("inf")
+
+    def _reject(self, priority: str, family: str):
+        with self._lock:
+            self.rejected[priority] += 1
+        raise FMPUnavailable(f"FMP call budget exhausted for {priority} traffic ({family})")
+
+    def acquire(self, priority: str, family: str, max_wait: Optional[float] = None):
+        """Block until the call fits in priority's share of the window"""
+        deadline = time.monotonic() + self._max_wait(priority, max_wait)
+        waited = False
+        while True:
+            wait_s = self._try_take(priority, family)
+            if wait_s <= 0:
+                return
+            if time.monotonic() + wait_s > deadline:
+                self._reject(priority, family)
+            if not waited:
+                waited = True
+                with self._lock:
+                    self.waits[priority] += 1
+            time.sleep(wait_s)
+
+    async def acquire_async(self, priority: str, family: str, max_wait: Optional[float] = None):
+        deadline = time.monotonic() + self._max_wait(priority, max_wait)
+        waited = False
+        while True:
+            wait_s = self._try_take(priority, family)
+            if wait_s <= 0:
+                return
+            if time.monotonic() + wait_s > deadline:
+                self._reject(priority, family)
+            if not waited:
+                waited = True
+                with self._lock:
+                    self.waits[priority] += 1
+            await asyncio.sleep(wait_s)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "calls_per_minute": self.calls_per_minute,
+                "used_last_minute": sum(1 for t in self._calls if t > now - WINDOW_SECONDS),
+                "caps": {p: self._cap(p) for p in self.shares},
+                "by_family": dict(self.by_family.most_common()),
+                "by_priority": dict(self.by_priority),
+                "waits": dict(self.waits),
+                "rejected": dict(self.rejected),
+            }
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int = FMP_BREAKER_THRESHOLD, reset_seconds: float = FMP_BREAKER_RESET_SECONDS):
+        self.threshold = max(1, threshold)
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opens = 0
+        self.short_circuited = 0
+
+    def allow(self) -> Optional[bool]:
+        """
+        None if the call must not go out; otherwise whether it is the half-open probe
+        (only one at a time; the caller must release_probe() when it finishes)
+        """
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.short_circuited += 1
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+                if self.state != self.OPEN:
+                    self.opens += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self):
+        """Free the probe slot of a call that ended without an outcome (cancelled, over budget)"""
+        with self._lock:
+            self._probing = False
+
+    def check(self, family: str) -> bool:
+        """Raise FMPUnavailable while the circuit is open; returns whether this call is the probe"""
+        probe = self.allow()
+        if probe is None:
+            raise FMPUnavailable(f"FMP circuit open; skipping {family} call")
+        return probe
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "opens": self.opens,
+                "short_circuited": self.short_circuited,
+            }
+
+
+class CircuitBreakers:
+    """One CircuitBreaker per endpoint family, created on first use"""
+
+    def __init__(self, threshold: int = FMP_BREAKER_THRESHOLD, reset_seconds: float = FMP_BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def for_family(self, family: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(family)
+            if breaker is None:
+                breaker = self._breakers[family] = CircuitBreaker(self.threshold, self.reset_seconds)
+            return breaker
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {family: b.stats() for family, b in sorted(breakers.items())}
+
+
+class StaleResponses:
+    """Last good response per request, served when FMP is unavailable"""
+
+    def __init__(self, max_age: int = FMP_STALE_MAX_AGE, maxsize: int = 2000):
+        # Entries are never fresh; only get_stale() reads them
+        self._cache = LRUTTLCache("fmp_stale", maxsize, ttl=0, max_stale=max_age)
+        self.served = 0
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict[str, Any]]) -> Tuple:
+        return (url, tuple(sorted((k, str(v)) for k, v in (params or {}).items() if k != "apikey")))
+
+    def remember(self, family: str, key: Tuple, data: Any):
+        if family not in STALE_EXCLUDED_FAMILIES:
+            self._cache.set(key, data)
+
+    def get_stale(self, key: Tuple) -> Optional[Any]:
+        data = self._cache.peek(key)
+        if data is not None:
+            self.served += 1
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": self._cache.stats()["size"], "served": self.served}
+
+
+# Shared by the sync and async FMP clients
+fmp_budget = FMPBudget()
+fmp_breakers = CircuitBreakers()
+fmp_stale_responses = StaleResponses()
+
+
+def budget_stats() -> Dict[str, Any]:
+    return {
+        "budget": fmp_budget.stats(),
+        "breakers": fmp_breakers.stats(),
+        "stale_responses": fmp_stale_responses.stats(),
+    }
@@ -0,0 +1,267 @@
+"""
+Shared HTTP client for all FMP traffic.
+
+Every module goes through one pooled, keep-alive session per process instead of
+calling requests.get, so repeated calls to financialmodelingprep.com reuse open
+TLS connections. Both facades share per-endpoint timeouts, full-jitter retries on
+transient failures, one process-wide call counter, and the call budget and
+circuit breaker from fmp_budget:
+
+    fmp_client.get_json(url, params)              # sync code paths
+    await async_fmp_client.get_json(url, params)  # async route handlers
+    fmp_client.get_json(url, params, priority=BACKFILL)
+
+While FMP is failing or the budget is spent, a request answered before is served
+its last good response instead of raising.
+"""
+import asyncio
+import os
+import random
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from fmp_budget import INTERACTIVE, CircuitBreaker, endpoint_family, fmp_breakers, fmp_budget, fmp_stale_responses
+from fmp_fetcher import FMP_MAX_RETRIES, FMPUnavailable, TokenBucket, call_with_retry
+
+FMP_BASE_URL = "https://financialmodelingprep.com/api/v3"
+FMP_STABLE_URL = "https://financialmodelingprep.com/stable"
+
+# Keep-alive connections held open to FMP per process
+FMP_POOL_SIZE = int(os.getenv("FMP_POOL_SIZE", "32"))
+# Read timeouts (seconds) by endpoint; large history downloads get more room
+FMP_TIMEOUTS = {
+    "historical-chart": 60,
+    "historical-price-full": 30,
+    "sp-500": 30,
+    "sp500_constituent": 30,
+    "quote": 5,
+}
+FMP_DEFAULT_TIMEOUT = int(os.getenv("FMP_DEFAULT_TIMEOUT", "10"))
+FMP_CONNECT_TIMEOUT = 5
+
+
+def endpoint_of(url: str) -> str:
+    """First path segment after the API version, e.g. 'historical-chart' or 'quote'"""
+    parts = [p for p in urlparse(url).path.split("/") if p]
+    if parts and parts[0] in ("api", "stable"):
+        parts = parts[2:] if parts[0] == "api" else parts[1:]
+    return parts[0] if parts else ""
+
+
+def timeout_for(url: str) -> float:
+    return FMP_TIMEOUTS.get(endpoint_of(url), FMP_DEFAULT_TIMEOUT)
+
+
+class CallCounter:
+    """Process-wide FMP call statistics, shared by the sync and async facades"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.by_endpoint: Counter = Counter()
+
+    def record(self, url: str, ok: bool):
+        with self._lock:
+            self.calls += 1
+            self.by_endpoint[endpoint_of(url)] += 1
+            if not ok:
+                self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "by_endpoint": dict(self.by_endpoint.most_common()),
+            }
+
+
+fmp_call_counter = CallCounter()
+
+
+def _is_transient(e: Exception) -> bool:
+    """Failures that say FMP is down or throttling (as opposed to a bad request or body)"""
+    if isinstance(e, requests.exceptions.InvalidJSONError):
+        # FMP answered; the body just wasn't JSON
+        return False
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    return status is None or status == 429 or status >= 500
+
+
+def _record_outcome(breaker: CircuitBreaker, e: Optional[Exception] = None):
+    if e is None or not _is_transient(e):
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+
+
+def _stale_or_raise(e: requests.exceptions.RequestException, key) -> Any:
+    if isinstance(e, FMPUnavailable) or _is_transient(e):
+        stale = fmp_stale_responses.get_stale(key)
+        if stale is not None:
+            return stale
+    raise e
+
+
+class FMPClient:
+    """Sync facade: a requests.Session with a connection pool sized for the fetch workers"""
+
+    def __init__(self, pool_size: int = FMP_POOL_SIZE):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _get_json_once(self, url: str, params: Optional[Dict[str, Any]], timeout: float,
+                       limiter: Optional[TokenBucket], priority: str) -> Any:
+        family = endpoint_family(endpoint_of(url))
+        # Short-circuited calls must not take a rate-limit token or a budget slot
+        breaker = fmp_breakers.for_family(family)
+        probe = breaker.check(family)
+        try:
+            if limiter is not None:
+                limiter.acquire()
+            fmp_budget.acquire(priority, family)
+            try:
+                response = self.session.get(url, params=params, timeout=(FMP_CONNECT_TIMEOUT, timeout))
+                response.raise_for_status()
+                data = response.json()
+            except Exception as e:
+                fmp_call_counter.record(url, ok=False)
+                _record_outcome(breaker, e)
+                raise
+            fmp_call_counter.record(url, ok=True)
+            _record_outcome(breaker)
+            return data
+        finally:
+            if probe:
+                breaker.release_probe()
+
+    def get_json(self, url: str, params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None,
+                 retries: int = FMP_MAX_RETRIES, limiter: Optional[TokenBucket] = None,
+                 priority: str = INTERACTIVE) -> Any:
+        """
+        GET an FMP endpoint and decode its JSON body. Connection errors, timeouts,
+        429 and 5xx are retried with backoff; anything else raises the usual
+        requests exception. `limiter` and the budget slot for `priority` are
+        acquired once per attempt.
+        """
+        key = fmp_stale_responses.key(url, params)
+        try:
+            data = call_with_retry(self._get_json_once, url, params, timeout or timeout_for(url), limiter,
+                                   priority, retries=retries)
+        except requests.exceptions.RequestException as e:
+            return _stale_or_raise(e, key)
+        fmp_stale_responses.remember(endpoint_family(endpoint_of(url)), key, data)
+        return data
+
+
+class AsyncFMPClient:
+    """
+    Async facade on aiohttp with a keep-alive connector. Failures are raised as the
+    same requests exceptions the sync facade raises, so handlers keep one except clause.
+    """
+
+    def __init__(self, pool_size: int = FMP_POOL_SIZE):
+        self.pool_size = pool_size
+        self._session = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self):
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        # A session is bound to the loop it was created on
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+            )
+            self._loop = loop
+        return self._session
+
+    async def _get_json_once(self, url: str, params: Optional[Dict[str, Any]], timeout: float, priority: str) -> Any:
+        import aiohttp
+
+        family = endpoint_family(endpoint_of(url))
+        # Short-circuited calls must not take a budget slot
+        breaker = fmp_breakers.for_family(family)
+        probe = breaker.check(family)
+        try:
+            await fmp_budget.acquire_async(priority, family)
+            try:
+                session = self._get_session()
+                client_timeout = aiohttp.ClientTimeout(total=timeout + FMP_CONNECT_TIMEOUT, sock_connect=FMP_CONNECT_TIMEOUT)
+                # aiohttp rejects None query values; requests silently drops them
+                query = {k: v for k, v in (params or {}).items() if v is not None}
+                async with session.get(url, params=query, timeout=client_timeout) as response:
+                    if response.status >= 400:
+                        raise requests.exceptions.HTTPError(
+                            f"{response.status} {response.reason} for url: {url}", response=_StatusOnly(response.status)
+                        )
+                    data = await response.json(content_type=None)
+            except requests.exceptions.RequestException as e:
+                fmp_call_counter.record(url, ok=False)
+                _record_outcome(breaker, e)
+                raise
+            except asyncio.TimeoutError as e:
+                fmp_call_counter.record(url, ok=False)
+                _record_outcome(breaker, e)
+                raise requests.exceptions.Timeout(f"Timed out after {timeout}s: {url}") from e
+            except aiohttp.ClientError as e:
+                fmp_call_counter.record(url, ok=False)
+                _record_outcome(breaker, e)
+                raise requests.exceptions.ConnectionError(str(e)) from e
+            except ValueError as e:
+                fmp_call_counter.record(url, ok=False)
+                invalid = requests.exceptions.InvalidJSONError(str(e))
+                _record_outcome(breaker, invalid)
+                raise invalid from e
+            fmp_call_counter.record(url, ok=True)
+            _record_outcome(breaker)
+            return data
+        finally:
+            # A cancelled probe (client disconnect, wait_for timeout) records nothing;
+            # free the slot so the next call can probe
+            if probe:
+                breaker.release_probe()
+
+    async def get_json(self, url: str, params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None,
+                       retries: int = FMP_MAX_RETRIES, base_delay: float = 1.0,
+                       priority: str = INTERACTIVE) -> Any:
+        """Async counterpart of FMPClient.get_json, with the same retry and stale rules"""
+        timeout = timeout or timeout_for(url)
+        key = fmp_stale_responses.key(url, params)
+        for attempt in range(retries + 1):
+            try:
+                data = await self._get_json_once(url, params, timeout, priority)
+                break
+            except requests.exceptions.RequestException as e:
+                retryable = not isinstance(e, FMPUnavailable) and _is_transient(e)
+                if attempt == retries or not retryable:
+                    return _stale_or_raise(e, key)
+                await asyncio.sleep(random.uniform(0, base_delay * (2 ** attempt)))
+        fmp_stale_responses.remember(endpoint_family(endpoint_of(url)), key, data)
+        return data
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class _StatusOnly:
+    """Minimal stand-in for requests.Response so retry checks can read status_code"""
+
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+
+# Shared by every module in this process
+fmp_client = FMPClient()
+async_fmp_client = AsyncFMPClient()
@@ -0,0 +1,107 @@
+"""
+Concurrent, rate-limited fetch engine for bulk FMP downloads.
+
+A process-wide token bucket paces every bulk request to the FMP plan's
+calls-per-minute ceiling, so the EOD updater and data_downloader can fan symbols
+out over a bounded worker pool instead of sleeping a fixed interval between calls.
+Transient failures (connection errors, 429, 5xx) are retried with full-jitter
+exponential backoff.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, TypeVar
+
+import requests
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Calls per minute allowed by the FMP plan (Starter 300, Premium 750, Ultimate 3000)
+FMP_CALLS_PER_MINUTE = int(os.getenv("FMP_CALLS_PER_MINUTE", "300"))
+# Worker threads used for bulk symbol fetches
+FMP_FETCH_WORKERS = int(os.getenv("FMP_FETCH_WORKERS", "8"))
+FMP_MAX_RETRIES = int(os.getenv("FMP_MAX_RETRIES", "3"))
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        # Allow roughly one second of burst by default
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.acquired = 0
+        self.waited_s = 0.0
+
+    def set_rate(self, rate_per_minute: float):
+        with self.lock:
+            self.rate = rate_per_minute / 60.0
+            self.capacity = max(1.0, self.rate)
+            self.tokens = min(self.tokens, self.capacity)
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until `tokens` are available, then take them"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    self.acquired += 1
+                    return
+                wait_s = (tokens - self.tokens) / self.rate
+                self.waited_s += wait_s
+            time.sleep(wait_s)
+
+    def stats(self) -> dict:
+        return {
+            "calls_per_minute": round(self.rate * 60),
+            "acquired": self.acquired,
+            "waited_s": round(self.waited_s, 2),
+        }
+
+
+# Shared by every bulk fetch in this process so parallel jobs stay under one ceiling
+fmp_rate_limiter = TokenBucket(FMP_CALLS_PER_MINUTE)
+
+
+class FMPUnavailable(requests.exceptions.RequestException):
+    """Raised without calling FMP (budget exhausted or circuit open); never retried"""
+
+
+def _is_retryable(e: requests.exceptions.RequestException) -> bool:
+    if isinstance(e, (FMPUnavailable, requests.exceptions.InvalidJSONError)):
+        # Not called, or FMP answered with a body that isn't JSON; asking again won't help
+        return False
+    response = getattr(e, "response", None)
+    if response is None:
+        return True  # connection errors, timeouts
+    return response.status_code == 429 or response.status_code >= 500
+
+
+def call_with_retry(fn: Callable[..., R], *args, retries: int = FMP_MAX_RETRIES,
+                    base_delay: float = 1.0, **kwargs) -> R:
+    """Call fn, retrying transient request failures with full-jitter exponential backoff"""
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except requests.exceptions.RequestException as e:
+            if attempt == retries or not _is_retryable(e):
+                raise
+            time.sleep(random.uniform(0, base_delay * (2 ** attempt)))
+
+
+def fetch_concurrently(fn: Callable[[T], R], items: Iterable[T],
+                       max_workers: int = FMP_FETCH_WORKERS) -> List[R]:
+    """Run fn over items on a bounded worker pool, preserving input order"""
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))),
+                            thread_name_prefix="fmp_fetch") as pool:
+        return list(pool.map(fn, items))
@@ -0,0 +1,199 @@
+"""
+Persistent per-ticker store of 5-minute bar history for the prediction service.
+
+Each ticker keeps its raw FMP bars (needed to re-regularize the newest day) and the
+regularized bars. The regularized bars live on a fixed 5-minute grid, so they are
+stored as one contiguous float32 (feature, bar) array in a .npy file that every
+process memory-maps read-only. N worker processes share the same page-cache pages
+instead of each holding a private copy of 500 tickers' history; only the frame
+handed to predict() is copied out, and only for the duration of that call.
+"""
+import json
+import os
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Row order of the stored arrays (AutoGluon column names)
+FEATURES = ["target", "open", "high", "low", "volume"]
+BAR_FREQ = pd.Timedelta("5min")
+
+
+class BarArrays:
+    """Regularized 5-minute bars of one ticker as a (len(FEATURES), bars) float32 array"""
+
+    def __init__(self, ticker: str, start: pd.Timestamp, values: np.ndarray):
+        self.ticker = ticker
+        self.start = pd.Timestamp(start)
+        self.values = values
+
+    @classmethod
+    def from_frame(cls, ticker: str, df: pd.DataFrame) -> "BarArrays":
+        """Build from an AutoGluon-format frame that is already on a continuous 5-minute grid"""
+        values = np.ascontiguousarray(df[FEATURES].to_numpy(dtype=np.float32).T)
+        return cls(ticker, df['timestamp'].iloc[0], values)
+
+    def __len__(self) -> int:
+        return self.values.shape[1]
+
+    @property
+    def last_timestamp(self) -> pd.Timestamp:
+        return self.start + (len(self) - 1) * BAR_FREQ
+
+    @property
+    def last_close(self) -> float:
+        return float(self.values[0, -1])
+
+    def _position(self, ts: pd.Timestamp) -> int:
+        """Index of the first bar at or after ts"""
+        pos = -((self.start - pd.Timestamp(ts)) // BAR_FREQ)
+        return int(min(max(pos, 0), len(self)))
+
+    def since(self, ts: pd.Timestamp) -> "BarArrays":
+        """Bars from ts onwards (a view, not a copy)"""
+        pos = self._position(ts)
+        return BarArrays(self.ticker, self.start + pos * BAR_FREQ, self.values[:, pos:])
+
+    def splice(self, new: "BarArrays") -> "BarArrays":
+        """Bars before new.start followed by new, with NaN bars filling any gap between them"""
+        keep = self.values[:, :self._position(new.start)]
+        gap = max(0, (new.start - self.start) // BAR_FREQ - keep.shape[1])
+        parts = [keep, np.full((len(FEATURES), gap), np.nan, dtype=np.float32), new.values]
+        return BarArrays(self.ticker, self.start if keep.shape[1] else new.start, np.concatenate(parts, axis=1))
+
+    def window(self, bars: int = 0) -> np.ndarray:
+        """The newest `bars` bars (all if 0) as a zero-copy view of the stored array"""
+        return self.values[:, -bars:] if 0 < bars < len(self) else self.values
+
+    def to_frame(self, bars: int = 0) -> pd.DataFrame:
+        """AutoGluon-format frame over the newest `bars` bars (all if 0); the window is copied into the frame"""
+        window = self.window(bars)
+        n = window.shape[1]
+        frame = {
+            'item_id': self.ticker,
+            'timestamp': pd.date_range(end=self.last_timestamp, periods=n, freq=BAR_FREQ),
+        }
+        frame.update({name: window[i] for i, name in enumerate(FEATURES)})
+        return pd.DataFrame(frame)
+
+
+class HistoryCache:
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Only metadata and read-only memory maps are kept per ticker; raw bars are
+        # read from disk when a ticker is re-synced
+        self._entries: Dict[str, Dict] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _meta_path(self, ticker: str) -> Path:
+        return self.cache_dir / f"{ticker}_5min.json"
+
+    def _raw_path(self, ticker: str) -> Path:
+        return self.cache_dir / f"{ticker}_5min.pkl"
+
+    def lock_for(self, ticker: str) -> threading.Lock:
+        """Per-ticker lock so concurrent callers don't sync the same ticker twice"""
+        with self._guard:
+            return self._locks.setdefault(ticker.upper(), threading.Lock())
+
+    def load(self, ticker: str) -> Optional[Dict]:
+        """Return {'clean': BarArrays, 'synced_at'} for a ticker, or None if never stored"""
+        key = ticker.upper()
+        path = self._meta_path(key)
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            return self._entries.get(key)
+
+        # Another process (e.g. an inference worker's parent) may have synced this ticker
+        entry = self._entries.get(key)
+        if entry is not None and self._mtimes.get(key) == mtime:
+            return entry
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            values = np.load(self.cache_dir / meta["values_file"], mmap_mode="r")
+        except Exception as e:
+            logger.warning(f"Discarding unreadable history cache for {key}: {e}")
+            return self._entries.get(key)
+
+        entry = {"clean": BarArrays(key, pd.Timestamp(meta["start"]), values), "synced_at": meta["synced_at"]}
+        self._entries[key] = entry
+        self._mtimes[key] = mtime
+        return entry
+
+    def load_raw(self, ticker: str) -> Optional[pd.DataFrame]:
+        """Raw FMP bars for a ticker, read from disk (only needed when re-syncing)"""
+        try:
+            return pd.read_pickle(self._raw_path(ticker.upper()))
+        except Exception:
+            return None
+
+    def save(self, ticker: str, raw: Optional[pd.DataFrame], clean: BarArrays) -> Dict:
+        """
+        Persist a ticker's history and return it memory-mapped. raw=None keeps the
+        stored raw bars and only refreshes the sync time.
+        """
+        key = ticker.upper()
+        synced_at = time.time()
+        entry = {"clean": clean, "synced_at": synced_at}
+        try:
+            if raw is not None:
+                self._replace(self._raw_path(key), lambda p: pd.to_pickle(raw, p))
+
+            if raw is None and isinstance(clean.values, np.memmap):
+                # Unchanged history: keep pointing at the file that is already mapped
+                values_file = Path(clean.values.filename).name
+            else:
+                # A new file per sync, so readers that still map the previous one are unaffected
+                values_file = f"{key}_5min.{time.time_ns()}.npy"
+                self._replace(self.cache_dir / values_file, lambda p: self._write_values(p, clean.values))
+
+            meta = {"start": clean.start.isoformat(), "rows": len(clean),
+                    "values_file": values_file, "synced_at": synced_at}
+            self._replace(self._meta_path(key), lambda p: p.write_text(json.dumps(meta), encoding="utf-8"))
+            self._mtimes[key] = self._meta_path(key).stat().st_mtime
+
+            entry["clean"] = BarArrays(key, clean.start, np.load(self.cache_dir / values_file, mmap_mode="r"))
+            self._remove_stale_values(key, keep=values_file)
+        except Exception as e:
+            # Disk persistence is best-effort; the in-memory copy still saves downloads
+            logger.warning(f"Failed to persist history cache for {key}: {e}")
+
+        self._entries[key] = entry
+        return entry
+
+    @staticmethod
+    def _write_values(path: Path, values: np.ndarray):
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=values.shape)
+        out[:] = values
+        out.flush()
+        del out
+
+    @staticmethod
+    def _replace(path: Path, write):
+        """Write via a process-unique temp file and atomically move it into place"""
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def _remove_stale_values(self, key: str, keep: str):
+        for path in self.cache_dir.glob(f"{key}_5min.*.npy"):
+            if path.name == keep:
+                continue
+            try:
+                # Open mappings stay valid after unlink on POSIX; elsewhere the file
+                # is left for the next sync to clean up
+                path.unlink()
+            except OSError:
+                pass
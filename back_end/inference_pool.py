@@ -0,0 +1,99 @@
+"""
+Process-pool inference workers for the prediction service.
+
+Each worker process loads the Chronos model once in its initializer and then takes
+ticker batches off the executor's call queue, so inference scales past the single
+core that one in-process TimeSeriesPredictor is limited to by the GIL.
+"""
+import logging
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Set in each worker process by _init_worker
+_worker_service = None
+
+
+def _init_worker():
+    """Load and warm up the model once per worker process"""
+    global _worker_service
+    # Imported here: the parent module imports this one
+    from stock_prediction_service import prediction_service
+
+    if not prediction_service.load_model():
+        raise RuntimeError("Inference worker failed to load model")
+    prediction_service.warm_up()
+    _worker_service = prediction_service
+
+
+def _ping() -> bool:
+    return _worker_service is not None
+
+
+def _forecast_batch(tickers: List[str]) -> Dict[str, Dict]:
+    """Run one predict() call over a batch of tickers inside a worker"""
+    return _worker_service.forecast_tickers(tickers)
+
+
+class InferencePool:
+    def __init__(self, size: int, batch_size: int):
+        self.size = size
+        self.batch_size = max(1, batch_size)
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.executor is not None
+
+    def start(self) -> bool:
+        """Spawn the workers and wait until each has loaded the model"""
+        if self.executor is not None:
+            return True
+        try:
+            # spawn, not fork: torch and the predictor are not fork-safe
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+            # One ping per worker forces every process to start and load the model now
+            pings = [self.executor.submit(_ping) for _ in range(self.size)]
+            if not all(p.result() for p in pings):
+                raise RuntimeError("Inference worker did not initialize")
+            logger.info(f"Inference pool started with {self.size} worker processes")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to start inference pool: {e}")
+            self.shutdown()
+            return False
+
+    def forecast(self, tickers: List[str]) -> Dict[str, Dict]:
+        """Split tickers into batches, fan them out across the workers and merge the results"""
+        if self.executor is None:
+            raise RuntimeError("Inference pool is not running")
+
+        # Spread small requests across workers, but never exceed the configured batch size
+        per_batch = min(self.batch_size, max(1, math.ceil(len(tickers) / self.size)))
+        futures = [
+            self.executor.submit(_forecast_batch, tickers[i:i + per_batch])
+            for i in range(0, len(tickers), per_batch)
+        ]
+        wait(futures)
+
+        results: Dict[str, Dict] = {}
+        for future in futures:
+            try:
+                results.update(future.result())
+            except Exception as e:
+                logger.error(f"Inference worker batch failed: {e}")
+        return results
+
+    def shutdown(self):
+        if self.executor is None:
+            return
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+        logger.info("Inference pool stopped")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""
+Load test: does the event loop stay responsive while FMP is slow?
+
+Starts a fake FMP server that answers every request after --fmp_delay seconds,
+points the stock routes at it, serves them with uvicorn and fires --requests
+concurrent calls at the FMP-backed handlers (gainers, losers, news, company,
+symbol) while a probe hits a trivial /ping route every 50 ms.
+
+    python load_test_event_loop.py --fmp_delay 1.0 --requests 40
+    python load_test_event_loop.py --blocking   # old behaviour: blocking calls on the loop
+
+With the async client, /ping latency should stay in the low milliseconds. With
+--blocking it grows to roughly the FMP delay times the queued handlers.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+from contextlib import asynccontextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import aiohttp
+import uvicorn
+from fastapi import FastAPI
+
+import fmp_client
+import market_snapshot
+import news_cache
+import stock_cache_service
+import stock_routes
+
+CANNED = {
+    "stock_market": [{"symbol": "AAPL", "name": "Apple", "price": 190.0, "change": 2.0, "changesPercentage": "1.05"}],
+    "stock_news": [{"title": "Headline", "publishedDate": "2024-01-02", "site": "x", "url": "https://x", "image": ""}],
+    "profile": [{"symbol": "AAPL", "companyName": "Apple", "exchangeShortName": "NASDAQ"}],
+}
+
+
+def start_fake_fmp(delay: float) -> str:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(delay)
+            endpoint = self.path.split("?")[0].split("/")[3]
+            payload = CANNED.get(endpoint, [])
+            if endpoint == "stock_news":
+                # News is split by symbol, so answer one article per requested ticker
+                query = parse_qs(urlparse(self.path).query)
+                tickers = (query.get("tickers") or ["AAPL"])[0].split(",")
+                payload = [{**payload[0], "symbol": t, "url": f"https://x/{t}"} for t in tickers]
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/api/v3"
+
+
+def use_blocking_client():
+    """Swap the async facade for blocking calls made on the loop, like the old handlers"""
+    async def blocking_get_json(url, params=None, timeout=None, **kwargs):
+        return fmp_client.fmp_client.get_json(url, params, timeout=timeout)
+    fmp_client.async_fmp_client.get_json = blocking_get_json
+
+
+def start_app(port: int):
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        await fmp_client.async_fmp_client.close()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(stock_routes.router)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+async def probe(session: aiohttp.ClientSession, base: str, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        async with session.get(f"{base}/ping") as response:
+            await response.read()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.05)
+
+
+async def run(args):
+    base = f"http://127.0.0.1:{args.port}"
+    paths = ["/stocks/gainers", "/stocks/losers"]
+    # Distinct tickers so the company/symbol caches don't absorb the load
+    for i in range(args.requests):
+        paths += [f"/stocks/news/T{i}", f"/stocks/company/T{i}", f"/stocks/symbol/T{i}"]
+    paths = paths[:args.requests]
+
+    async with aiohttp.ClientSession() as session:
+        # Baseline /ping latency with an idle loop
+        idle: list = []
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(session, base, stop, idle))
+        await asyncio.sleep(0.5)
+        stop.set()
+        await probe_task
+
+        loaded: list = []
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(session, base, stop, loaded))
+        started = time.perf_counter()
+
+        async def call(path):
+            async with session.get(f"{base}{path}") as response:
+                await response.read()
+                return response.status
+
+        statuses = await asyncio.gather(*(call(p) for p in paths))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe_task
+
+    def summary(values):
+        ms = sorted(v * 1000 for v in values)
+        return (f"n={len(ms)} p50={statistics.median(ms):.1f}ms "
+                f"p99={ms[min(len(ms) - 1, int(len(ms) * 0.99))]:.1f}ms max={ms[-1]:.1f}ms")
+
+    mode = "blocking" if args.blocking else "async"
+    ok = sum(1 for s in statuses if s == 200)
+    print(f"mode={mode} fmp_delay={args.fmp_delay}s requests={len(paths)} ok={ok} wall={elapsed:.2f}s")
+    print(f"  /ping idle:        {summary(idle)}")
+    print(f"  /ping under load:  {summary(loaded)}")
+    print(f"  fmp calls: {fmp_client.fmp_call_counter.stats()}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Event-loop responsiveness under slow FMP responses.")
+    ap.add_argument("--fmp_delay", type=float, default=1.0, help="Seconds the fake FMP server waits per call")
+    ap.add_argument("--requests", type=int, default=40, help="Concurrent FMP-backed requests")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--blocking", action="store_true", help="Emulate blocking requests.get in the handlers")
+    args = ap.parse_args()
+
+    fake = start_fake_fmp(args.fmp_delay)
+    stock_routes.fmp_base_url = fake
+    stock_cache_service.fmp_base_url = fake
+    market_snapshot.FMP_BASE_URL = fake
+    news_cache.FMP_BASE_URL = fake
+    if args.blocking:
+        use_blocking_client()
+
+    server, thread = start_app(args.port)
+    try:
+        asyncio.run(run(args))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -25,15 +25,31 @@ import balance_routes
 import budget_goals
 import stripe_routes
 from startup import initialize_prediction_service, cleanup_prediction_service
+from fmp_client import async_fmp_client
+from market_snapshot import market_snapshot
+from quote_hub import quote_hub
+from ticker_search import ticker_search
+from news_cache import news_cache
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Initialize prediction service in background (non-blocking)
     # This runs in a separate thread so it doesn't block server startup
     initialize_prediction_service()
+    # Background refresh of the shared market snapshot (indices, movers, news)
+    market_snapshot.start()
+    # Periodic rebuild of the local ticker search index from FMP's symbol list
+    ticker_search.start()
+    # Scheduled refresh of headlines for recently viewed tickers
+    news_cache.start()
     yield
     # Shutdown: Cleanup
     cleanup_prediction_service()
+    await market_snapshot.stop()
+    await quote_hub.stop()
+    await ticker_search.stop()
+    await news_cache.stop()
+    await async_fmp_client.close()
 
 app = FastAPI(lifespan=lifespan)
 
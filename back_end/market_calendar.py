@@ -0,0 +1,172 @@
+"""
+NYSE trading calendar computed offline from the exchange's holiday rules.
+
+Covers the regular full-day holidays (with weekend observance) and the 13:00 early
+closes, so the EOD scheduler can skip non-trading days without asking FMP and the
+regularizers can stop synthesizing bars after a half-day close. Years are computed
+on first use and cached; one-off closures (e.g. national days of mourning) can be
+added through MARKET_EXTRA_HOLIDAYS=YYYY-MM-DD,YYYY-MM-DD.
+"""
+import os
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+REGULAR_OPEN = time(9, 30)
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+
+def _easter(year: int) -> date:
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """n-th given weekday of a month (n=-1 for the last one); Monday is 0"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = (date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1))
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(d: date) -> date:
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday"""
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+
+def _year_calendar(year: int) -> Tuple[Dict[date, str], Set[date]]:
+    holidays: Dict[date, str] = {}
+
+    # NYSE does not move New Year's Day back into the previous year
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays[_observed(new_year)] = "New Year's Day"
+    if year >= 1998:
+        holidays[_nth_weekday(year, 1, 0, 3)] = "Martin Luther King Jr. Day"
+    holidays[_nth_weekday(year, 2, 0, 3)] = "Washington's Birthday"
+    holidays[_easter(year) - timedelta(days=2)] = "Good Friday"
+    holidays[_nth_weekday(year, 5, 0, -1)] = "Memorial Day"
+    if year >= 2022:
+        holidays[_observed(date(year, 6, 19))] = "Juneteenth"
+    holidays[_observed(date(year, 7, 4))] = "Independence Day"
+    holidays[_nth_weekday(year, 9, 0, 1)] = "Labor Day"
+    thanksgiving = _nth_weekday(year, 11, 3, 4)
+    holidays[thanksgiving] = "Thanksgiving Day"
+    holidays[_observed(date(year, 12, 25))] = "Christmas Day"
+
+    # 13:00 closes: July 3, the day after Thanksgiving and Christmas Eve, when those
+    # fall on a weekday that is not itself a holiday
+    early: Set[date] = set()
+    for d in (date(year, 7, 3), thanksgiving + timedelta(days=1), date(year, 12, 24)):
+        if d.weekday() < 5 and d not in holidays:
+            early.add(d)
+    return holidays, early
+
+
+class MarketCalendar:
+    def __init__(self, extra_holidays: Optional[List[date]] = None):
+        self._holidays: Dict[date, str] = {d: "Special closure" for d in (extra_holidays or [])}
+        self._early_closes: Set[date] = set()
+        self._years: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def _ensure_year(self, year: int):
+        if year in self._years:
+            return
+        with self._lock:
+            if year in self._years:
+                return
+            holidays, early = _year_calendar(year)
+            for d, name in holidays.items():
+                self._holidays.setdefault(d, name)
+            self._early_closes |= early
+            self._years.add(year)
+
+    def holiday_name(self, d: date) -> Optional[str]:
+        self._ensure_year(d.year)
+        return self._holidays.get(d)
+
+    def is_trading_day(self, d: date) -> bool:
+        return d.weekday() < 5 and self.holiday_name(d) is None
+
+    def is_early_close(self, d: date) -> bool:
+        self._ensure_year(d.year)
+        return d in self._early_closes and self.is_trading_day(d)
+
+    def session_close(self, d: date) -> Optional[time]:
+        """Closing time of the regular session on d, or None when the market is closed"""
+        if not self.is_trading_day(d):
+            return None
+        return EARLY_CLOSE if self.is_early_close(d) else REGULAR_CLOSE
+
+    def next_trading_day(self, d: date) -> date:
+        """First trading day strictly after d"""
+        d += timedelta(days=1)
+        while not self.is_trading_day(d):
+            d += timedelta(days=1)
+        return d
+
+    def last_trading_day(self, d: date) -> date:
+        """Most recent trading day on or before d"""
+        while not self.is_trading_day(d):
+            d -= timedelta(days=1)
+        return d
+
+    def trading_days(self, start: date, end: date) -> List[date]:
+        """Trading days in [start, end]"""
+        days = []
+        d = start
+        while d <= end:
+            if self.is_trading_day(d):
+                days.append(d)
+            d += timedelta(days=1)
+        return days
+
+    def early_close_days(self, start: date, end: date) -> List[date]:
+        for year in range(start.year, end.year + 1):
+            self._ensure_year(year)
+        return sorted(d for d in self._early_closes if start <= d <= end and self.is_trading_day(d))
+
+    def after_early_close(self, timestamps: pd.Series) -> np.ndarray:
+        """
+        Vectorized mask of timestamps (naive, exchange local time) that fall after
+        the 13:00 close on an early-close day.
+        """
+        ts = pd.to_datetime(pd.Series(timestamps))
+        if ts.empty:
+            return np.zeros(0, dtype=bool)
+        days = ts.dt.normalize()
+        early = self.early_close_days(days.min().date(), days.max().date())
+        if not early:
+            return np.zeros(len(ts), dtype=bool)
+        on_early_day = days.isin(pd.DatetimeIndex(early)).to_numpy()
+        close = pd.Timedelta(hours=EARLY_CLOSE.hour, minutes=EARLY_CLOSE.minute)
+        return on_early_day & ((ts - days) > close).to_numpy()
+
+
+def _extra_holidays_from_env() -> List[date]:
+    raw = os.getenv("MARKET_EXTRA_HOLIDAYS", "")
+    return [datetime.strptime(s.strip(), "%Y-%m-%d").date() for s in raw.split(",") if s.strip()]
+
+
+# Shared by the EOD updater, data_downloader and the prediction service
+nyse_calendar = MarketCalendar(_extra_holidays_from_env())
@@ -0,0 +1,201 @@
+"""
+In-memory market snapshot (indices, top gainers/losers, general news) shared by the
+stock and overview routers.
+
+A background task refreshes it from FMP every MARKET_SNAPSHOT_REFRESH_SECONDS, so
+dashboard traffic reads memory instead of fanning out four FMP calls per request.
+Readers never wait on FMP once anything has loaded. If the snapshot is older than
+two periods (e.g. a process that never started the task), a reader starts one
+refresh in the background and is served the current data meanwhile. Only the very
+first read waits. Readers and the background task refresh under one lock, so at
+most one refresh is in flight. A section that fails to refresh keeps its previous value.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from fmp_client import FMP_BASE_URL, async_fmp_client
+from news_cache import NEWS_LIMIT, clean_article, dedupe_articles
+
+logger = logging.getLogger(__name__)
+
+MARKET_SNAPSHOT_REFRESH_SECONDS = int(os.getenv("MARKET_SNAPSHOT_REFRESH_SECONDS", "60"))
+
+INDEX_SYMBOLS = ["^GSPC", "^DJI", "^IXIC"]
+MOVERS_LIMIT = 5
+
+
+def clean_movers(data: List[Dict[str, Any]], descending: bool) -> List[Dict[str, Any]]:
+    """
+    Top movers, prioritizing high-value stocks (price >= $80), then mid-tier (20-79),
+    then the rest (<20), always avoiding ETFs and forex/pair symbols.
+    """
+    cleaned = []
+    for d in data or []:
+        try:
+            price = float(d.get("price", 0))
+            change = float(d.get("change", 0))
+            pct = float(str(d.get("changesPercentage", "0")).replace("%", "").replace("+", ""))
+            symbol = (d.get("symbol") or "").upper()
+            name = d.get("name") or symbol
+            if not symbol or "ETF" in name or any(x in symbol for x in ["/", "="]):
+                continue
+            cleaned.append({
+                "symbol": symbol,
+                "name": name,
+                "price": round(price, 2),
+                "change": round(change, 2),
+                "change_percent": round(pct, 2),
+            })
+        except (TypeError, ValueError, AttributeError):
+            continue
+
+    tiers = [
+        [e for e in cleaned if e["price"] >= 80],
+        [e for e in cleaned if 20 <= e["price"] < 80],
+        [e for e in cleaned if e["price"] < 20],
+    ]
+    for tier in tiers:
+        tier.sort(key=lambda e: e["change_percent"], reverse=descending)
+    return (tiers[0] + tiers[1] + tiers[2])[:MOVERS_LIMIT]
+
+
+async def _fetch_indices() -> List[Dict[str, Any]]:
+    data = await async_fmp_client.get_json(f"{FMP_BASE_URL}/quotes/index", {"apikey": os.getenv("FMP_API_KEY")})
+    return [
+        {"index": d["name"], "price": d["price"], "change_percent": d["changesPercentage"]}
+        for d in data if d.get("symbol") in INDEX_SYMBOLS
+    ]
+
+
+async def _fetch_movers(kind: str) -> List[Dict[str, Any]]:
+    data = await async_fmp_client.get_json(f"{FMP_BASE_URL}/stock_market/{kind}", {"apikey": os.getenv("FMP_API_KEY")})
+    return clean_movers(data, descending=(kind == "gainers"))
+
+
+async def _fetch_news() -> List[Dict[str, Any]]:
+    # Over-fetch a little so syndicated duplicates don't leave the feed short
+    params = {"limit": NEWS_LIMIT * 2, "apikey": os.getenv("FMP_API_KEY")}
+    news = await async_fmp_client.get_json(f"{FMP_BASE_URL}/stock_news", params)
+    return dedupe_articles((clean_article(n) for n in news or []), NEWS_LIMIT)
+
+
+class MarketSnapshot:
+    SECTIONS = {
+        "indices": _fetch_indices,
+        "gainers": lambda: _fetch_movers("gainers"),
+        "losers": lambda: _fetch_movers("losers"),
+        "news": _fetch_news,
+    }
+
+    def __init__(self, refresh_seconds: int = MARKET_SNAPSHOT_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.data: Dict[str, List[Dict[str, Any]]] = {name: [] for name in self.SECTIONS}
+        self.updated_at: Optional[datetime] = None
+        self._refreshed_monotonic: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._revalidation: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.section_errors = 0
+        self.reads = 0
+
+    def _age(self) -> Optional[float]:
+        if self._refreshed_monotonic is None:
+            return None
+        return time.monotonic() - self._refreshed_monotonic
+
+    @property
+    def is_due(self) -> bool:
+        """Time for the background task's next refresh"""
+        age = self._age()
+        return age is None or age >= self.refresh_seconds
+
+    @property
+    def is_stale(self) -> bool:
+        """Past the point the background task should have refreshed it by"""
+        age = self._age()
+        return age is None or age >= self.refresh_seconds * 2
+
+    async def refresh(self):
+        """Fetch every section concurrently; failed sections keep their previous value"""
+        names = list(self.SECTIONS)
+        results = await asyncio.gather(*(self.SECTIONS[n]() for n in names), return_exceptions=True)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                self.section_errors += 1
+                logger.warning(f"Market snapshot: failed to refresh {name}: {result}")
+            else:
+                self.data[name] = result
+        self.updated_at = datetime.utcnow()
+        self._refreshed_monotonic = time.monotonic()
+        self.refreshes += 1
+
+    def _refresh_lock(self) -> asyncio.Lock:
+        # Created lazily so it binds to the loop that first uses it
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _refresh_if(self, needed: Callable[[], bool]):
+        """Refresh unless someone else did while this caller waited for the lock"""
+        async with self._refresh_lock():
+            if needed():
+                await self.refresh()
+
+    async def _revalidate(self):
+        try:
+            await self._refresh_if(lambda: self.is_stale)
+        except Exception as e:
+            logger.error(f"Market snapshot refresh failed: {e}")
+
+    async def get(self) -> Dict[str, Any]:
+        """Current snapshot; only waits on FMP if nothing has been loaded yet"""
+        self.reads += 1
+        if self._refreshed_monotonic is None:
+            await self._refresh_if(lambda: self._refreshed_monotonic is None)
+        elif self.is_stale and (self._revalidation is None or self._revalidation.done()):
+            # Background task not running (or behind): refresh without blocking the read
+            self._revalidation = asyncio.get_running_loop().create_task(self._revalidate())
+        return {**self.data, "updated_at": self.updated_at.isoformat() if self.updated_at else None}
+
+    async def _run(self):
+        while True:
+            try:
+                await self._refresh_if(lambda: self.is_due)
+            except Exception as e:
+                logger.error(f"Market snapshot refresh failed: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self):
+        """Start the background refresh task on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        for task in (self._task, self._revalidation):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._revalidation = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "refresh_seconds": self.refresh_seconds,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "background_task": self._task is not None and not self._task.done(),
+            "refreshes": self.refreshes,
+            "section_errors": self.section_errors,
+            "reads": self.reads,
+        }
+
+
+# Shared by stock_routes and overview_routes
+market_snapshot = MarketSnapshot()
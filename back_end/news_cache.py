@@ -0,0 +1,217 @@
+"""
+Per-ticker headline cache for /stocks/news/{ticker}.
+
+Page views read memory. Tickers viewed in the last NEWS_WATCH_MINUTES are kept
+on a watch list that a background task refreshes every NEWS_REFRESH_SECONDS.
+It batches up to NEWS_BATCH_SIZE tickers into one multi-ticker stock_news request.
+A first view of an unknown ticker waits briefly (NEWS_BATCH_WINDOW_SECONDS), so
+that concurrent first views of other tickers share one request. Articles are
+deduplicated by URL and merged with the previous headlines. When a batch hits
+its response limit, tickers that got nothing are re-requested on their own
+rather than cached as having no news.
+
+General market news is refreshed with the market snapshot (market_snapshot.py)
+through the same clean/dedupe helpers.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Union
+
+from fmp_client import FMP_BASE_URL, async_fmp_client
+
+logger = logging.getLogger(__name__)
+
+NEWS_LIMIT = 5
+NEWS_REFRESH_SECONDS = int(os.getenv("NEWS_REFRESH_SECONDS", "300"))
+NEWS_WATCH_MINUTES = int(os.getenv("NEWS_WATCH_MINUTES", "30"))
+NEWS_MAX_TICKERS = int(os.getenv("NEWS_MAX_TICKERS", "500"))
+NEWS_BATCH_SIZE = int(os.getenv("NEWS_BATCH_SIZE", "25"))
+NEWS_BATCH_WINDOW_SECONDS = 0.05
+
+
+def clean_article(n: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "title": n.get("title", ""),
+        "publishedDate": n.get("publishedDate", ""),
+        "site": n.get("site", ""),
+        "url": n.get("url", ""),
+        "image": n.get("image", ""),
+    }
+
+
+def dedupe_articles(articles: Iterable[Dict[str, Any]], limit: int = NEWS_LIMIT) -> List[Dict[str, Any]]:
+    """Newest first, one article per URL (articles without a URL are kept)"""
+    seen = set()
+    unique = []
+    for a in sorted(articles, key=lambda a: a.get("publishedDate") or "", reverse=True):
+        url = a.get("url")
+        if url:
+            if url in seen:
+                continue
+            seen.add(url)
+        unique.append(a)
+    return unique[:limit]
+
+
+class NewsCache:
+    def __init__(self, refresh_seconds: int = NEWS_REFRESH_SECONDS, batch_size: int = NEWS_BATCH_SIZE):
+        self.refresh_seconds = refresh_seconds
+        self.batch_size = max(1, batch_size)
+        self._articles: Dict[str, List[Dict[str, Any]]] = {}
+        self._refreshed_at: Dict[str, float] = {}
+        # ticker -> last view (monotonic), oldest first
+        self._watched: "OrderedDict[str, float]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._flush_scheduled = False
+        # The loop only keeps weak references to tasks; a collected flush would strand its futures
+        self._flushes: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.views = 0
+        self.memory_hits = 0
+        self.news_requests = 0
+        self.failed_requests = 0
+
+    def _watch(self, ticker: str):
+        self._watched[ticker] = time.monotonic()
+        self._watched.move_to_end(ticker)
+        while len(self._watched) > NEWS_MAX_TICKERS:
+            old, _ = self._watched.popitem(last=False)
+            self._articles.pop(old, None)
+            self._refreshed_at.pop(old, None)
+
+    async def _fetch_batch(self, tickers: List[str]) -> Dict[str, Union[List[Dict[str, Any]], Exception]]:
+        """
+        One stock_news request for several tickers, merged into the cache. A crowded-out
+        ticker whose own re-fetch failed maps to that error instead of its headlines.
+        """
+        self.news_requests += 1
+        # FMP's limit is for the whole response, so leave room for busy tickers
+        limit = NEWS_LIMIT * len(tickers) * 4
+        params = {"tickers": ",".join(tickers), "limit": limit, "apikey": os.getenv("FMP_API_KEY")}
+        try:
+            data = await async_fmp_client.get_json(f"{FMP_BASE_URL}/stock_news", params)
+        except Exception:
+            self.failed_requests += 1
+            raise
+        fetched: Dict[str, List[Dict[str, Any]]] = {t: [] for t in tickers}
+        for n in data if isinstance(data, list) else []:
+            symbol = (n.get("symbol") or "").upper()
+            if symbol in fetched:
+                fetched[symbol].append(clean_article(n))
+        crowded: List[str] = []
+        if len(tickers) > 1 and isinstance(data, list) and len(data) >= limit:
+            # The response hit its cap, so a ticker with nothing may just have been
+            # crowded out by busier ones; ask for those on their own
+            crowded = [t for t in tickers if not fetched[t]]
+        now = time.monotonic()
+        for ticker, articles in fetched.items():
+            if ticker in crowded:
+                continue
+            self._articles[ticker] = dedupe_articles(articles + self._articles.get(ticker, []))
+            self._refreshed_at[ticker] = now
+        results: Dict[str, Union[List[Dict[str, Any]], Exception]] = {t: self._articles.get(t, []) for t in tickers}
+        if crowded:
+            solo = await asyncio.gather(*(self._fetch_batch([t]) for t in crowded), return_exceptions=True)
+            for ticker, result in zip(crowded, solo):
+                if isinstance(result, Exception):
+                    # Left uncached (or at its old headlines) so the next view asks again
+                    logger.warning(f"News fetch failed for {ticker}: {result}")
+                    results[ticker] = result
+                else:
+                    results[ticker] = result[ticker]
+        return results
+
+    async def _refresh(self, tickers: List[str]):
+        batches = [tickers[i:i + self.batch_size] for i in range(0, len(tickers), self.batch_size)]
+        results = await asyncio.gather(*(self._fetch_batch(b) for b in batches), return_exceptions=True)
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                logger.warning(f"News refresh failed for {len(batch)} tickers: {result}")
+
+    async def _flush(self):
+        await asyncio.sleep(NEWS_BATCH_WINDOW_SECONDS)
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, {}
+        tickers = list(pending)
+        batches = [tickers[i:i + self.batch_size] for i in range(0, len(tickers), self.batch_size)]
+        results = await asyncio.gather(*(self._fetch_batch(b) for b in batches), return_exceptions=True)
+        for batch, result in zip(batches, results):
+            for ticker in batch:
+                future = pending[ticker]
+                if future.done():
+                    continue
+                value = result if isinstance(result, Exception) else result[ticker]
+                if isinstance(value, Exception):
+                    future.set_exception(value)
+                else:
+                    future.set_result(value)
+
+    def _enqueue(self, ticker: str) -> asyncio.Future:
+        """Future for ticker's headlines, fetched with whatever else is queued in this window"""
+        future = self._pending.get(ticker)
+        if future is None:
+            future = self._pending[ticker] = asyncio.get_running_loop().create_future()
+            # Nobody may await a background revalidation; don't log its error as unretrieved
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            task = asyncio.get_running_loop().create_task(self._flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        return future
+
+    async def get(self, ticker: str) -> List[Dict[str, Any]]:
+        """Latest headlines for ticker; cached ones are returned without waiting on FMP"""
+        ticker = ticker.upper()
+        self.views += 1
+        self._watch(ticker)
+        if ticker in self._articles:
+            self.memory_hits += 1
+            # Background task not running (or behind): revalidate without blocking the view
+            if time.monotonic() - self._refreshed_at[ticker] >= self.refresh_seconds * 2:
+                self._enqueue(ticker)
+            return self._articles[ticker]
+        return await self._enqueue(ticker)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            cutoff = time.monotonic() - NEWS_WATCH_MINUTES * 60
+            for ticker in [t for t, viewed in self._watched.items() if viewed < cutoff]:
+                del self._watched[ticker]
+                self._articles.pop(ticker, None)
+                self._refreshed_at.pop(ticker, None)
+            try:
+                await self._refresh(list(self._watched))
+            except Exception as e:
+                logger.error(f"News refresh failed: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "watched_tickers": len(self._watched),
+            "cached_tickers": len(self._articles),
+            "views": self.views,
+            "memory_hits": self.memory_hits,
+            "news_requests": self.news_requests,
+            "failed_requests": self.failed_requests,
+        }
+
+
+# Shared by /stocks/news/{ticker} in this process
+news_cache = NewsCache()
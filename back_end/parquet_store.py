@@ -0,0 +1,210 @@
+"""
+Partitioned columnar store for OHLCV bars.
+
+Layout: <root>/<kind>/<symbol>/<freq>/<YYYY-MM>.parquet, where kind is "raw" or
+"clean". Prices and volume are stored as float32. Appending only rewrites the
+monthly partitions that the new rows fall into, so nightly updates no longer
+grow with the length of the history.
+
+Each series directory also holds a _manifest.json, kept in sync with every partition
+write, recording row counts, first/last timestamps and content hashes per partition
+and for the whole series, so callers can plan incremental fetches without opening
+any data file.
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+COLUMNS = ["datetime", "open", "high", "low", "close", "volume"]
+VALUE_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+
+class ParquetBarStore:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._manifest_lock = threading.Lock()
+        # Per-series manifests, loaded lazily from <series dir>/_manifest.json
+        self._manifests: Dict[str, Optional[Dict]] = {}
+
+    # ---------------- manifest ----------------
+
+    @staticmethod
+    def _series_key(kind: str, symbol: str, freq: str) -> str:
+        return f"{kind}/{symbol}/{freq}"
+
+    def _manifest_path(self, kind: str, symbol: str, freq: str) -> Path:
+        return self._series_dir(kind, symbol, freq) / "_manifest.json"
+
+    def _load_manifest(self, kind: str, symbol: str, freq: str) -> Optional[Dict]:
+        """Read a series manifest, rebuilding it from the partitions if it is missing or corrupt"""
+        path = self._manifest_path(kind, symbol, freq)
+        if path.exists():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+
+        parts = sorted(self._series_dir(kind, symbol, freq).glob("*.parquet"))
+        if not parts:
+            return None
+        manifest = {"partitions": {}}
+        for part in parts:
+            df = pd.read_parquet(part, columns=["datetime"])
+            manifest["partitions"][part.stem] = self._partition_entry(part, df)
+        self._summarize(manifest)
+        self._save_manifest(kind, symbol, freq, manifest)
+        return manifest
+
+    def _manifest(self, kind: str, symbol: str, freq: str) -> Optional[Dict]:
+        """Cached series manifest; caller must hold _manifest_lock"""
+        key = self._series_key(kind, symbol, freq)
+        if key not in self._manifests:
+            self._manifests[key] = self._load_manifest(kind, symbol, freq)
+        return self._manifests[key]
+
+    @staticmethod
+    def _partition_entry(path: Path, df: pd.DataFrame) -> Dict:
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        return {
+            "rows": int(len(df)),
+            "first": df["datetime"].min().isoformat() if len(df) else None,
+            "last": df["datetime"].max().isoformat() if len(df) else None,
+            "sha256": digest,
+        }
+
+    @staticmethod
+    def _summarize(manifest: Dict):
+        parts = [manifest["partitions"][m] for m in sorted(manifest["partitions"])]
+        non_empty = [p for p in parts if p["rows"]]
+        manifest["rows"] = sum(p["rows"] for p in parts)
+        manifest["first"] = non_empty[0]["first"] if non_empty else None
+        manifest["last"] = non_empty[-1]["last"] if non_empty else None
+        manifest["sha256"] = hashlib.sha256("".join(p["sha256"] for p in parts).encode()).hexdigest()
+
+    def _save_manifest(self, kind: str, symbol: str, freq: str, manifest: Dict):
+        path = self._manifest_path(kind, symbol, freq)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def series_info(self, kind: str, symbol: str, freq: str) -> Optional[Dict]:
+        """Row count, first/last timestamp and hashes for a series, straight from its manifest"""
+        with self._manifest_lock:
+            manifest = self._manifest(kind, symbol, freq)
+            return json.loads(json.dumps(manifest)) if manifest else None
+
+    def last_timestamp(self, kind: str, symbol: str, freq: str) -> Optional[pd.Timestamp]:
+        """Newest stored timestamp for a series without opening any data file"""
+        info = self.series_info(kind, symbol, freq)
+        if not info or not info.get("last"):
+            return None
+        return pd.Timestamp(info["last"])
+
+    def summary(self) -> Dict[str, Dict]:
+        """Rows and time range of every stored series"""
+        out = {}
+        for path in sorted(self.root.glob("*/*/*/_manifest.json")):
+            freq_dir = path.parent
+            kind, symbol, freq = freq_dir.parent.parent.name, freq_dir.parent.name, freq_dir.name
+            info = self.series_info(kind, symbol, freq)
+            if info:
+                out[self._series_key(kind, symbol, freq)] = {k: info[k] for k in ("rows", "first", "last")}
+        return out
+
+    # ---------------- partitions ----------------
+
+    def _series_dir(self, kind: str, symbol: str, freq: str) -> Path:
+        return self.root / kind / symbol / freq
+
+    def _partition_path(self, kind: str, symbol: str, freq: str, month: str) -> Path:
+        return self._series_dir(kind, symbol, freq) / f"{month}.parquet"
+
+    def partitions(self, kind: str, symbol: str, freq: str) -> List[str]:
+        """Month keys (YYYY-MM) stored for a series, oldest first"""
+        with self._manifest_lock:
+            manifest = self._manifest(kind, symbol, freq)
+            return sorted(manifest["partitions"]) if manifest else []
+
+    def has_series(self, kind: str, symbol: str, freq: str) -> bool:
+        return bool(self.partitions(kind, symbol, freq))
+
+    def _typed(self, df: pd.DataFrame) -> pd.DataFrame:
+        out = df[COLUMNS].copy()
+        out["datetime"] = pd.to_datetime(out["datetime"])
+        out[VALUE_COLUMNS] = out[VALUE_COLUMNS].apply(pd.to_numeric, errors="coerce").astype("float32")
+        return out
+
+    def read_partition(self, kind: str, symbol: str, freq: str, month: str) -> pd.DataFrame:
+        path = self._partition_path(kind, symbol, freq, month)
+        if not path.exists():
+            return pd.DataFrame(columns=COLUMNS)
+        return pd.read_parquet(path)
+
+    def read(self, kind: str, symbol: str, freq: str,
+             start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """Read a series, touching only the partitions that overlap [start, end]"""
+        months = self.partitions(kind, symbol, freq)
+        if start is not None:
+            months = [m for m in months if m >= pd.Timestamp(start).strftime("%Y-%m")]
+        if end is not None:
+            months = [m for m in months if m <= pd.Timestamp(end).strftime("%Y-%m")]
+        if not months:
+            return pd.DataFrame(columns=COLUMNS)
+
+        df = pd.concat([self.read_partition(kind, symbol, freq, m) for m in months], ignore_index=True)
+        if start is not None:
+            df = df[df["datetime"] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df["datetime"] <= pd.Timestamp(end)]
+        return df.reset_index(drop=True)
+
+    def append(self, kind: str, symbol: str, freq: str, new_df: pd.DataFrame) -> List[str]:
+        """
+        Merge new rows into their monthly partitions (new rows win on duplicate
+        timestamps). Returns the month keys that were rewritten.
+        """
+        if new_df is None or new_df.empty:
+            return []
+
+        new_df = self._typed(new_df)
+        series_dir = self._series_dir(kind, symbol, freq)
+        series_dir.mkdir(parents=True, exist_ok=True)
+
+        touched = {}
+        for month, rows in new_df.groupby(new_df["datetime"].dt.strftime("%Y-%m"), sort=True):
+            existing = self.read_partition(kind, symbol, freq, month)
+            merged = pd.concat([existing, rows], ignore_index=True) if not existing.empty else rows
+            merged = merged.drop_duplicates(subset=["datetime"], keep="last").sort_values("datetime")
+            touched[month] = self._write_partition(kind, symbol, freq, month, merged.reset_index(drop=True))
+
+        with self._manifest_lock:
+            manifest = self._manifest(kind, symbol, freq) or {"partitions": {}}
+            manifest["partitions"].update(touched)
+            self._summarize(manifest)
+            self._save_manifest(kind, symbol, freq, manifest)
+            self._manifests[self._series_key(kind, symbol, freq)] = manifest
+        return list(touched)
+
+    def _write_partition(self, kind: str, symbol: str, freq: str, month: str, df: pd.DataFrame) -> Dict:
+        """Write one partition atomically and return its manifest entry"""
+        path = self._partition_path(kind, symbol, freq, month)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        df.to_parquet(tmp_path, index=False)
+        entry = self._partition_entry(tmp_path, df)
+        os.replace(tmp_path, path)
+        return entry
+
+    def export_excel(self, kind: str, symbol: str, freq: str, path: Path) -> int:
+        """Write a whole series to .xlsx on demand; returns the row count"""
+        df = self.read(kind, symbol, freq)
+        df.to_excel(path, index=False)
+        return len(df)
@@ -1,6 +1,7 @@
 import os
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from cryptography.fernet import Fernet
@@ -22,6 +23,7 @@ from datetime import datetime, timedelta
 from datetime import date
 from user_categories import create_user_category, UserCategoryCreate
 from category_colors import get_category_color
+from previous_close import fetch_quotes
 import requests
 import json
 
@@ -730,6 +732,15 @@ async def get_investments(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _load_holdings(db: Session, user_id: int):
+    return (
+        db.query(Plaid_Investment_Holding)
+        .join(Plaid_Investment, Plaid_Investment.account_id == Plaid_Investment_Holding.account_id)
+        .filter(Plaid_Investment.user_id == user_id)
+        .all()
+    )
+
+
 @router.get("/investments/holdings")
 async def get_investment_holdings(
     db: Session = Depends(get_db),
@@ -740,19 +751,14 @@ async def get_investment_holdings(
     enriched with live price and daily change data from FMP.
     """
     try:
-        fmp_api_key = os.getenv("FMP_API_KEY")
-        base_url = "https://financialmodelingprep.com/api/v3"
-
-        holdings = (
-            db.query(Plaid_Investment_Holding)
-            .join(Plaid_Investment, Plaid_Investment.account_id == Plaid_Investment_Holding.account_id)
-            .filter(Plaid_Investment.user_id == user["id"])
-            .all()
-        )
+        holdings = await run_in_threadpool(_load_holdings, db, user["id"])
 
         if not holdings:
             return {"holdings": [], "count": 0}
 
+        # One batched multi-symbol quote request instead of a blocking call per holding
+        quotes = await fetch_quotes(h.symbol for h in holdings if h.symbol)
+
         result = []
         for h in holdings:
             symbol = h.symbol or None
@@ -761,23 +767,17 @@ async def get_investment_holdings(
             daily_change = 0.0
             daily_change_percent = 0.0
 
-            # Fetch daily quote data if symbol available
-            if symbol:
+            q = quotes.get(symbol.upper()) if symbol else None
+            if q:
                 try:
-                    quote_url = f"{base_url}/quote/{symbol.upper()}"
-                    res = requests.get(quote_url, params={"apikey": fmp_api_key}, timeout=5)
-                    res.raise_for_status()
-                    quote = res.json()
-                    if quote and isinstance(quote, list):
-                        q = quote[0]
-                        current_price = float(q.get("price", current_price))
-                        change_val = float(q.get("change", 0))
-                        change_pct = float(str(q.get("changesPercentage", "0")).replace("%", "").replace("+", ""))
-                        daily_change = change_val
-                        daily_change_percent = change_pct
-                        value = current_price * (h.quantity or 0)
-                except Exception as e:
-                    print(f"FMP fetch error for {symbol}: {e}")
+                    current_price = float(q.get("price", current_price))
+                    change_val = float(q.get("change", 0))
+                    change_pct = float(str(q.get("changesPercentage", "0")).replace("%", "").replace("+", ""))
+                    daily_change = change_val
+                    daily_change_percent = change_pct
+                    value = current_price * (h.quantity or 0)
+                except (TypeError, ValueError) as e:
+                    print(f"FMP quote parse error for {symbol}: {e}")
 
             result.append({
                 "symbol": symbol,
@@ -1,6 +1,7 @@
 """
 Configuration for the stock prediction service
 """
+import os
 
 # Default tickers to predict (can be modified via API)
 DEFAULT_TICKERS = ['AAPL']
@@ -10,6 +11,30 @@ PREDICTION_INTERVAL_MINUTES = 5
 HISTORICAL_DAYS_BACK = 30
 PREDICTION_HORIZON_MINUTES = 5
 
+# Batch inference settings
+# Number of tickers stacked into a single TimeSeriesDataFrame per predict() call
+PREDICTION_BATCH_SIZE = int(os.getenv("PREDICTION_BATCH_SIZE", "32"))
+
+# Number of inference worker processes; each loads the model once.
+# 0 keeps inference in the API process on the shared predictor.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+
+# Retry-After (seconds) sent with 503s while the model is loading or warming up
+MODEL_RETRY_AFTER_SECONDS = int(os.getenv("MODEL_RETRY_AFTER_SECONDS", "30"))
+
+# History cache settings
+# Regularized 5-minute history is persisted per ticker; warm calls only download newer bars
+HISTORY_CACHE_DIR = os.getenv(
+    "HISTORY_CACHE_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "AI_model", "cache", "history"),
+)
+# Skip the network entirely if a ticker was synced within this many seconds
+HISTORY_REFRESH_SECONDS = int(os.getenv("HISTORY_REFRESH_SECONDS", "60"))
+# Newest bars handed to the predictor per ticker (0 = full history). Not every model
+# in the ensemble is bounded by a context length, so only set this after checking
+# that forecasts are unchanged at the chosen window.
+PREDICTION_CONTEXT_BARS = int(os.getenv("PREDICTION_CONTEXT_BARS", "0"))
+
 # Model settings
 MODEL_PATH = "../AI_model/AutoGluonModels_multi"
 
@@ -0,0 +1,158 @@
+"""
+Batched previous-close lookups for portfolio valuation.
+
+Previous closes come from FMP's multi-symbol quote endpoint (one request per
+FMP_QUOTE_BATCH_SIZE symbols) rather than one historical-price-full request per
+holding. A symbol's previous close only changes when a new session starts, so
+values are cached by (symbol, trading date) and a portfolio refresh only asks FMP
+for symbols it hasn't seen yet today.
+"""
+import asyncio
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from fmp_client import FMP_BASE_URL, async_fmp_client
+from market_calendar import REGULAR_OPEN, nyse_calendar
+
+logger = logging.getLogger(__name__)
+
+# Symbols per multi-symbol quote request
+FMP_QUOTE_BATCH_SIZE = int(os.getenv("FMP_QUOTE_BATCH_SIZE", "50"))
+
+
+async def _quote_batch(symbols: List[str]) -> Dict[str, Dict]:
+    """One multi-symbol quote request; raises like async_fmp_client.get_json"""
+    url = f"{FMP_BASE_URL}/quote/{','.join(symbols)}"
+    data = await async_fmp_client.get_json(url, {"apikey": os.getenv("FMP_API_KEY")})
+    return {q["symbol"].upper(): q for q in data or [] if isinstance(q, dict) and q.get("symbol")}
+
+
+async def fetch_quotes(symbols: Iterable[str], batch_size: int = FMP_QUOTE_BATCH_SIZE) -> Dict[str, Dict]:
+    """Full FMP quotes by symbol, one request per batch; symbols of failed batches are left out"""
+    wanted = list(dict.fromkeys(s.upper() for s in symbols if s))
+    batches = [wanted[i:i + batch_size] for i in range(0, len(wanted), max(1, batch_size))]
+    quotes: Dict[str, Dict] = {}
+    for batch, result in zip(batches, await asyncio.gather(*(_quote_batch(b) for b in batches),
+                                                           return_exceptions=True)):
+        if isinstance(result, Exception):
+            logger.warning(f"Quote batch failed ({len(batch)} symbols): {result}")
+        else:
+            quotes.update(result)
+    return quotes
+
+
+def current_session_date() -> date:
+    """
+    Latest session that has opened (NY time). FMP's previousClose is the close of
+    the session before it, so it is constant for the whole of this key.
+    """
+    now = datetime.now(ZoneInfo("America/New_York"))
+    today = now.date()
+    if nyse_calendar.is_trading_day(today) and now.time() >= REGULAR_OPEN:
+        return today
+    return nyse_calendar.last_trading_day(today - timedelta(days=1))
+
+
+class PreviousCloseService:
+    def __init__(self, batch_size: int = FMP_QUOTE_BATCH_SIZE):
+        self.batch_size = max(1, batch_size)
+        # None marks a symbol FMP returned no quote for, so it isn't re-requested all day
+        self._closes: Dict[Tuple[str, date], Optional[float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+
+    async def _fetch_batch(self, symbols: List[str]) -> Optional[Dict[str, float]]:
+        self.requests += 1
+        try:
+            quotes = await _quote_batch(symbols)
+        except Exception as e:
+            logger.warning(f"Previous-close quote batch failed ({len(symbols)} symbols): {e}")
+            return None
+        closes = {}
+        for symbol, q in quotes.items():
+            try:
+                closes[symbol] = float(q["previousClose"])
+            except (KeyError, TypeError, ValueError):
+                continue
+        return closes
+
+    async def get_previous_closes(self, symbols: Iterable[str]) -> Dict[str, float]:
+        """Previous close per symbol; symbols FMP has no quote for are left out"""
+        session = current_session_date()
+        wanted = list(dict.fromkeys(s.upper() for s in symbols if s))
+        result: Dict[str, float] = {}
+        missing = []
+        with self._lock:
+            for symbol in wanted:
+                key = (symbol, session)
+                if key not in self._closes:
+                    missing.append(symbol)
+                elif self._closes[key] is not None:
+                    result[symbol] = self._closes[key]
+            self.hits += len(wanted) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+            fetched: Dict[str, Optional[float]] = {}
+            for batch, closes in zip(batches, await asyncio.gather(*(self._fetch_batch(b) for b in batches))):
+                if closes is not None:  # failed batches are retried on the next call
+                    fetched.update({symbol: closes.get(symbol) for symbol in batch})
+            with self._lock:
+                # Entries from earlier sessions can never be read again
+                for key in [k for k in self._closes if k[1] != session]:
+                    del self._closes[key]
+                for symbol, close in fetched.items():
+                    self._closes[(symbol, session)] = close
+            result.update({symbol: close for symbol, close in fetched.items() if close is not None})
+        return result
+
+    async def valuate(self, positions: List[Dict]) -> Dict:
+        """
+        Day change for a whole portfolio in one call.
+        positions: [{'symbol', 'price', 'quantity', ...}]; any extra keys are passed through.
+        Returns per-position change_value/change_percent (for positions with a known
+        previous close) plus the portfolio's total daily gain over those positions.
+        """
+        closes = await self.get_previous_closes(p["symbol"] for p in positions if p.get("symbol"))
+        valued = []
+        daily_gain = 0.0
+        previous_value = 0.0
+        for p in positions:
+            symbol = (p.get("symbol") or "").upper()
+            prev = closes.get(symbol)
+            if not symbol or not p.get("price") or not prev:
+                continue
+            quantity = p.get("quantity") or 0
+            daily_gain += (p["price"] - prev) * quantity
+            previous_value += prev * quantity
+            valued.append({
+                **p,
+                "previous_close": prev,
+                "change_value": round(p["price"] - prev, 2),
+                "change_percent": round((p["price"] - prev) / prev * 100, 2),
+            })
+        return {
+            "positions": valued,
+            "daily_gain": round(daily_gain, 2),
+            "daily_gain_percent": round(daily_gain / previous_value * 100, 2) if previous_value else 0.0,
+            "priced_positions": len(valued),
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "cached": len(self._closes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "quote_requests": self.requests,
+            }
+
+
+previous_close_service = PreviousCloseService()
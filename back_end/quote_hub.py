@@ -0,0 +1,155 @@
+"""
+Shared last-quote feed for /stocks/ws/getlastquote.
+
+Sockets subscribe to tickers instead of pulling FMP themselves. A single poll task
+asks FMP's multi-symbol quote endpoint for every subscribed ticker once per
+QUOTE_HUB_TICK_SECONDS (FMP_QUOTE_BATCH_SIZE symbols per request) and fans each
+changed quote out to the sockets watching it. Tickers are reference-counted by
+subscriber: the last unsubscribe drops a ticker from the poll, and the task stops
+when nothing is subscribed.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Set
+
+from fmp_client import FMP_BASE_URL, async_fmp_client
+from previous_close import FMP_QUOTE_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+QUOTE_HUB_TICK_SECONDS = float(os.getenv("QUOTE_HUB_TICK_SECONDS", "2"))
+
+
+class QuoteSubscriber:
+    """One socket's mailbox: only the newest quote per ticker is kept until it is sent"""
+
+    def __init__(self):
+        self.symbols: Set[str] = set()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._ready = asyncio.Event()
+
+    def push(self, symbol: str, quote: Dict[str, Any]):
+        self._pending[symbol] = quote
+        self._ready.set()
+
+    async def next(self) -> List[Dict[str, Any]]:
+        await self._ready.wait()
+        self._ready.clear()
+        quotes, self._pending = list(self._pending.values()), {}
+        return quotes
+
+
+class QuoteHub:
+    def __init__(self, tick_seconds: float = QUOTE_HUB_TICK_SECONDS, batch_size: int = FMP_QUOTE_BATCH_SIZE):
+        self.tick_seconds = tick_seconds
+        self.batch_size = max(1, batch_size)
+        self._subscribers: Dict[str, Set[QuoteSubscriber]] = {}
+        self.latest: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.ticks = 0
+        self.quote_requests = 0
+        self.failed_requests = 0
+
+    def subscribe(self, symbol: str, subscriber: QuoteSubscriber):
+        """
+        Add symbol to the subscriber's feed (idempotent). The last known quote is
+        pushed right away; an unseen symbol triggers an immediate poll.
+        """
+        symbol = symbol.upper()
+        self._subscribers.setdefault(symbol, set()).add(subscriber)
+        subscriber.symbols.add(symbol)
+        if symbol in self.latest:
+            subscriber.push(symbol, self.latest[symbol])
+        else:
+            self._ensure_running().set()
+
+    def unsubscribe(self, symbol: str, subscriber: QuoteSubscriber):
+        symbol = symbol.upper()
+        subscriber.symbols.discard(symbol)
+        subscribers = self._subscribers.get(symbol)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[symbol]
+            self.latest.pop(symbol, None)
+
+    def unsubscribe_all(self, subscriber: QuoteSubscriber):
+        for symbol in list(subscriber.symbols):
+            self.unsubscribe(symbol, subscriber)
+
+    def _ensure_running(self) -> asyncio.Event:
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._wake
+
+    async def _fetch_batch(self, symbols: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        url = f"{FMP_BASE_URL}/quote/{','.join(symbols)}"
+        self.quote_requests += 1
+        try:
+            data = await async_fmp_client.get_json(url, {"apikey": os.getenv("FMP_API_KEY")})
+        except Exception as e:
+            self.failed_requests += 1
+            logger.warning(f"Quote hub batch failed ({len(symbols)} symbols): {e}")
+            return None
+        return {q["symbol"].upper(): q for q in data or [] if isinstance(q, dict) and q.get("symbol")}
+
+    async def poll_once(self):
+        symbols = list(self._subscribers)
+        if not symbols:
+            return
+        batches = [symbols[i:i + self.batch_size] for i in range(0, len(symbols), self.batch_size)]
+        results = await asyncio.gather(*(self._fetch_batch(b) for b in batches))
+        self.ticks += 1
+        for batch, quotes in zip(batches, results):
+            if quotes is None:  # keep serving the last quote; the next tick retries
+                continue
+            for symbol in batch:
+                quote = quotes.get(symbol, {"symbol": symbol, "error": "No quote data available"})
+                if self.latest.get(symbol) == quote:
+                    continue
+                subscribers = self._subscribers.get(symbol)
+                if not subscribers:  # unsubscribed while the request was in flight
+                    continue
+                self.latest[symbol] = quote
+                for subscriber in subscribers:
+                    subscriber.push(symbol, quote)
+
+    async def _run(self):
+        while self._subscribers:
+            self._wake.clear()
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.error(f"Quote hub poll failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.tick_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tick_seconds": self.tick_seconds,
+            "symbols": len(self._subscribers),
+            "subscriptions": sum(len(s) for s in self._subscribers.values()),
+            "poll_task": self._task is not None and not self._task.done(),
+            "ticks": self.ticks,
+            "quote_requests": self.quote_requests,
+            "failed_requests": self.failed_requests,
+        }
+
+
+# Shared by every /ws/getlastquote connection in this process
+quote_hub = QuoteHub()
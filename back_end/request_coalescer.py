@@ -0,0 +1,43 @@
+"""
+In-flight request deduplication for async route handlers.
+
+Concurrent callers asking for the same key await one shared future instead of each
+starting their own job; the future is dropped as soon as it completes, so the next
+request after that starts fresh work.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class RequestCoalescer:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.requests = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await the in-flight job for `key`, starting it with `factory()` if there is none"""
+        self.requests += 1
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._discard(key, f))
+
+        # Shield so one caller disconnecting doesn't cancel the job for everyone else
+        return await asyncio.shield(future)
+
+    def _discard(self, key: Hashable, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "executed": self.requests - self.coalesced,
+            "hit_rate": round(self.coalesced / self.requests, 4) if self.requests else 0.0,
+            "in_flight": len(self._inflight),
+        }
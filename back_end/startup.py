@@ -13,8 +13,9 @@ def initialize_prediction_service():
     def _load_in_background():
         try:
             logger.info("Starting prediction service initialization in background...")
-            # Load the model (this can take time, so it's in a background thread)
-            if prediction_service.load_model():
+            # Load the model, or start the inference worker pool if configured
+            # (this can take time, so it's in a background thread)
+            if prediction_service.initialize_model():
                 logger.info("Prediction service initialized successfully")
                 # Optionally start predictions for default tickers
                 tickers = prediction_service.get_daily_prediction_tickers()
@@ -42,6 +43,7 @@ def cleanup_prediction_service():
         pass
     try:
         prediction_service.stop_predictions()
+        prediction_service.shutdown_inference_pool()
         logger.info("Prediction service cleaned up successfully")
     except Exception as e:
         logger.error(f"Error cleaning up prediction service: {e}")
\ No newline at end of file
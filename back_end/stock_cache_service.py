@@ -1,8 +1,9 @@
-import time
 import requests
 from fastapi import HTTPException
 import os
 from dotenv import load_dotenv
+from fmp_client import async_fmp_client
+from ttl_cache import LRUTTLCache, SQLiteCacheBackend
 
 load_dotenv()
 
@@ -10,92 +11,69 @@ load_dotenv()
 fmp_api_key = os.getenv("FMP_API_KEY")
 fmp_base_url = "https://financialmodelingprep.com/api/v3"
 
-# In-memory cache
-symbol_cache = {}
-company_cache = {}
+# Bounded LRU caches; set STOCK_CACHE_DB to a file path to share them across the
+# workers on this host
 CACHE_TTL = 60 * 60 * 12  # 12 hours
+CACHE_MAXSIZE = int(os.getenv("STOCK_CACHE_MAXSIZE", "5000"))
+# How long past the TTL an entry may still be served while it is refreshed
+CACHE_MAX_STALE = int(os.getenv("STOCK_CACHE_MAX_STALE", str(60 * 60 * 24 * 7)))
+_cache_db = os.getenv("STOCK_CACHE_DB")
+_cache_backend = SQLiteCacheBackend(_cache_db) if _cache_db else None
 
+symbol_cache = LRUTTLCache("symbol", CACHE_MAXSIZE, CACHE_TTL, CACHE_MAX_STALE, _cache_backend)
+company_cache = LRUTTLCache("company", CACHE_MAXSIZE, CACHE_TTL, CACHE_MAX_STALE, _cache_backend)
 
-def get_cached_symbol(ticker: str):
-    now = time.time()
-    entry = symbol_cache.get(ticker.upper())
-    if entry and (now - entry["timestamp"] < CACHE_TTL):
-        return entry["exchange"]
-    return None
 
+def cache_stats() -> dict:
+    return {"symbol": symbol_cache.stats(), "company": company_cache.stats()}
 
-def set_cached_symbol(ticker: str, exchange: str):
-    symbol_cache[ticker.upper()] = {"exchange": exchange, "timestamp": time.time()}
 
+def _profile_or_404(ticker: str, data):
+    if not data or not isinstance(data, list) or len(data) == 0:
+        raise HTTPException(status_code=404, detail=f"No company profile found for {ticker}")
+    return data[0]
 
-def get_cached_company(ticker: str):
-    now = time.time()
-    entry = company_cache.get(ticker.upper())
-    if entry and (now - entry["timestamp"] < CACHE_TTL):
-        return entry["data"]
-    return None
 
+def _clean_company(ticker: str, company: dict) -> dict:
+    return {
+        "symbol": company.get("symbol", ticker.upper()),
+        "companyName": company.get("companyName") or company.get("name") or ticker.upper(),
+        "exchange": company.get("exchangeShortName", ""),
+        "industry": company.get("industry", ""),
+        "sector": company.get("sector", ""),
+        "ceo": company.get("ceo", ""),
+        "marketCap": company.get("mktCap", 0),
+        "website": company.get("website", ""),
+        "description": company.get("description", ""),
+    }
 
-def set_cached_company(ticker: str, data: dict):
-    company_cache[ticker.upper()] = {"data": data, "timestamp": time.time()}
 
+def _exchange_of(company: dict) -> str:
+    return company.get("exchangeShortName", "NASDAQ") or "NASDAQ"
 
-def fetch_symbol_from_fmp(ticker: str):
+
+async def fetch_symbol_from_fmp_async(ticker: str):
     """Fetch exchange info for a ticker via FMP and cache it."""
-    cached = get_cached_symbol(ticker)
-    if cached:
-        return cached
-
-    url = f"{fmp_base_url}/profile/{ticker.upper()}"
-    params = {"apikey": fmp_api_key}
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if not data or not isinstance(data, list) or len(data) == 0:
-            raise HTTPException(status_code=404, detail=f"No company profile found for {ticker}")
-
-        company = data[0]
-        exchange = company.get("exchangeShortName", "NASDAQ") or "NASDAQ"
-        set_cached_symbol(ticker, exchange)
-        return exchange
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch symbol: {str(e)}")
-
-
-def fetch_company_snapshot(ticker: str):
+    async def load():
+        url = f"{fmp_base_url}/profile/{ticker.upper()}"
+        try:
+            return _exchange_of(_profile_or_404(ticker, await async_fmp_client.get_json(url, {"apikey": fmp_api_key})))
+        except requests.exceptions.RequestException as e:
+            raise HTTPException(status_code=500, detail=f"Failed to fetch symbol: {str(e)}")
+
+    return await symbol_cache.get_or_load(ticker.upper(), load)
+
+
+async def fetch_company_snapshot_async(ticker: str):
     """Fetch detailed company info with caching."""
-    cached = get_cached_company(ticker)
-    if cached:
-        return cached
-
-    url = f"{fmp_base_url}/profile/{ticker.upper()}"
-    params = {"apikey": fmp_api_key}
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-
-        if not data or not isinstance(data, list) or len(data) == 0:
-            raise HTTPException(status_code=404, detail=f"No company profile found for {ticker}")
-
-        company = data[0]
-        cleaned = {
-            "symbol": company.get("symbol", ticker.upper()),
-            "companyName": company.get("companyName") or company.get("name") or ticker.upper(),
-            "exchange": company.get("exchangeShortName", ""),
-            "industry": company.get("industry", ""),
-            "sector": company.get("sector", ""),
-            "ceo": company.get("ceo", ""),
-            "marketCap": company.get("mktCap", 0),
-            "website": company.get("website", ""),
-            "description": company.get("description", ""),
-        }
-
-        set_cached_company(ticker, cleaned)
-        return cleaned
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch company info: {str(e)}")
+    async def load():
+        url = f"{fmp_base_url}/profile/{ticker.upper()}"
+        try:
+            return _clean_company(ticker, _profile_or_404(ticker, await async_fmp_client.get_json(url, {"apikey": fmp_api_key})))
+        except requests.exceptions.RequestException as e:
+            raise HTTPException(status_code=500, detail=f"Failed to fetch company info: {str(e)}")
+
+    return await company_cache.get_or_load(ticker.upper(), load)
 
 def normalize_ticker_symbol(ticker: str, for_tradingview=False) -> str:
     """
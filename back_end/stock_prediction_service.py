@@ -1,17 +1,26 @@
+import time
+_module_import_started = time.perf_counter()
+
 import os
+import numpy as np
 import pandas as pd
 import asyncio
 import logging
 import requests
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-from autogluon.timeseries import TimeSeriesDataFrame, TimeSeriesPredictor
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import Stock_Prediction
+from prediction_config import PREDICTION_BATCH_SIZE, HISTORY_CACHE_DIR, HISTORY_REFRESH_SECONDS, INFERENCE_WORKERS, PREDICTION_CONTEXT_BARS
+from history_cache import BarArrays, HistoryCache
+from fmp_budget import PREDICTION
+from fmp_client import fmp_client
+from inference_pool import InferencePool
+from market_calendar import nyse_calendar
 import threading
-import time
 import random
 
 load_dotenv()
@@ -20,6 +29,29 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# AutoGluon (and torch underneath it) is imported on first use, so API workers
+# that only serve auth/transactions/budget routes never pay for it at startup.
+_autogluon_ts = None
+_autogluon_lock = threading.Lock()
+
+# Seconds spent importing, reported by /stocks/predictions/status
+IMPORT_TIMINGS: Dict[str, float] = {}
+
+
+def _load_autogluon():
+    """Import autogluon.timeseries on first call and return the module"""
+    global _autogluon_ts
+    if _autogluon_ts is None:
+        with _autogluon_lock:
+            if _autogluon_ts is None:
+                started = time.perf_counter()
+                import autogluon.timeseries as ag_ts
+                IMPORT_TIMINGS['autogluon.timeseries'] = round(time.perf_counter() - started, 3)
+                logger.info(f"Imported autogluon.timeseries in {IMPORT_TIMINGS['autogluon.timeseries']:.2f}s")
+                _autogluon_ts = ag_ts
+    return _autogluon_ts
+
+
 class StockPredictionService:
     def __init__(self):
         self.predictor = None
@@ -28,7 +60,108 @@ class StockPredictionService:
         self.model_path = os.path.join(os.path.dirname(__file__), "..", "AI_model", "AutoGluonModels_multi")
         self.is_running = False
         self.prediction_thread = None
-        
+        self.history_cache = HistoryCache(HISTORY_CACHE_DIR)
+        self.batch_size = PREDICTION_BATCH_SIZE
+        self._metrics_lock = threading.Lock()
+        self.metrics = {
+            'batch_size': self.batch_size,
+            'chunks_run': 0,
+            'tickers_predicted': 0,
+            'tickers_skipped': 0,
+            'last_chunk_seconds': None,
+            'last_cycle_seconds': None,
+            'last_cycle_at': None,
+            'forecast_cache_hits': 0,
+            'forecast_cache_misses': 0,
+            'forecast_inflight_waits': 0,
+        }
+        # Latest forecast per ticker, valid until a newer bar arrives
+        self._forecast_cache: Dict[str, Dict] = {}
+        # Forecasts being computed, so concurrent requests for the same bar wait instead of predicting again
+        self._forecast_inflight: Dict[Tuple[str, pd.Timestamp], Future] = {}
+        self._forecast_lock = threading.Lock()
+        # Worker-process pool used instead of the in-process predictor when INFERENCE_WORKERS > 0
+        self.inference_pool: Optional[InferencePool] = None
+        # Readiness state machine: loading -> warming -> ready, or failed
+        self.state = 'loading'
+        self.state_since = datetime.now()
+        self.state_error: Optional[str] = None
+        self.state_timings: Dict[str, float] = {}
+        self._state_started = time.perf_counter()
+
+    @property
+    def model_ready(self) -> bool:
+        """True once the model is loaded and warmed up, either in-process or on the worker pool"""
+        return self.state == 'ready'
+
+    def _set_state(self, state: str, error: Optional[str] = None):
+        now = time.perf_counter()
+        # Record how long the state we are leaving lasted
+        self.state_timings[self.state] = round(now - self._state_started, 3)
+        self._state_started = now
+        self.state = state
+        self.state_since = datetime.now()
+        self.state_error = error
+        logger.info(f"Prediction model state: {state}")
+
+    def get_readiness(self) -> Dict:
+        return {
+            'state': self.state,
+            'since': self.state_since,
+            'error': self.state_error,
+            'timings': dict(self.state_timings),
+        }
+
+    def initialize_model(self) -> bool:
+        """Load the model in-process, or start the inference worker pool if one is configured"""
+        self._set_state('loading')
+        if INFERENCE_WORKERS <= 0:
+            if not self.load_model():
+                self._set_state('failed', "Model could not be loaded")
+                return False
+            self._set_state('warming')
+            self.warm_up()
+        else:
+            if self.inference_pool is None:
+                self.inference_pool = InferencePool(INFERENCE_WORKERS, self.batch_size)
+            # Workers load and warm up the model in their initializer
+            if not self.inference_pool.start():
+                self._set_state('failed', "Inference worker pool could not be started")
+                return False
+        self._set_state('ready')
+        return True
+
+    def warm_up(self) -> bool:
+        """
+        Run one forecast on synthetic bars so the first real predict() call doesn't
+        pay the one-time JIT compilation and allocation costs.
+        """
+        try:
+            started = time.perf_counter()
+            periods = 2048
+            rng = np.random.default_rng(0)
+            close = (100 + rng.normal(0, 0.1, periods).cumsum()).astype('float32')
+            synthetic = pd.DataFrame({
+                'item_id': '__warmup__',
+                'timestamp': pd.date_range(end=pd.Timestamp.now().floor('5min'), periods=periods, freq='5min'),
+                'target': close,
+                'open': close,
+                'high': close,
+                'low': close,
+                'volume': np.full(periods, 1000, dtype='float32'),
+            })
+            self._forecast_frames({'__warmup__': synthetic})
+            logger.info(f"Model warm-up forecast completed in {time.perf_counter() - started:.2f}s")
+            return True
+        except Exception as e:
+            # A failed warm-up only means the first real request pays the cost
+            logger.warning(f"Model warm-up failed: {e}")
+            return False
+
+    def shutdown_inference_pool(self):
+        if self.inference_pool is not None:
+            self.inference_pool.shutdown()
+
     def load_model(self):
         """Load the trained Chronos model"""
         try:
@@ -36,72 +169,95 @@ class StockPredictionService:
                 logger.error(f"Model path not found: {self.model_path}")
                 return False
                 
-            self.predictor = TimeSeriesPredictor.load(self.model_path, require_version_match=False)
+            self.predictor = _load_autogluon().TimeSeriesPredictor.load(self.model_path, require_version_match=False)
             logger.info("Chronos model loaded successfully")
             return True
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
             return False
     
-    def fetch_stock_data(self, ticker: str, days_back: int = 730) -> Optional[pd.DataFrame]:
-        """Fetch historical stock data from FMP API"""
-        try:
-            # Calculate date range
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=days_back)
-            
-            # Format dates for FMP API
-            from_date = start_date.strftime("%Y-%m-%d")
-            to_date = end_date.strftime("%Y-%m-%d")
-            
-            # FMP API endpoint for intraday data (5-minute intervals)
-            url = f"{self.fmp_base_url}/historical-chart/5min/{ticker}"
-            params = {
-                'from': from_date,
-                'to': to_date,
-                'apikey': self.fmp_api_key
-            }
-            
-            # Add timeout to prevent indefinite hangs
-            response = requests.get(url, params=params, timeout=60)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            if not data:
-                logger.warning(f"No data received for {ticker}")
+    def fetch_stock_data(self, ticker: str, days_back: int = 730) -> Optional[BarArrays]:
+        """
+        Return regularized 5-minute history for a ticker as memory-mapped float32 arrays.
+        History is kept in the local history cache; only bars after the last stored
+        timestamp are downloaded, and recently synced tickers skip the network entirely.
+        """
+        with self.history_cache.lock_for(ticker):
+            try:
+                cached = self.history_cache.load(ticker)
+                if cached is not None and time.time() - cached['synced_at'] < HISTORY_REFRESH_SECONDS:
+                    return cached['clean']
+
+                end_date = datetime.now()
+                window_start = end_date - timedelta(days=days_back)
+                cached_raw = self.history_cache.load_raw(ticker) if cached is not None else None
+
+                if cached_raw is not None and not cached_raw.empty:
+                    # FMP filters by calendar date, so re-request the last stored day
+                    # to pick up bars that were still forming at the previous sync
+                    resume_day = cached_raw['datetime'].iloc[-1].normalize()
+                    new_raw = self._download_bars(ticker, resume_day, end_date)
+                    if new_raw is None or new_raw.empty:
+                        cached = self.history_cache.save(ticker, None, cached['clean'])
+                        return cached['clean']
+
+                    old_raw = cached_raw[cached_raw['datetime'] < resume_day]
+                    raw = pd.concat([old_raw, new_raw], ignore_index=True)
+                    raw = raw.drop_duplicates(subset=['datetime'], keep='last').sort_values('datetime')
+                    raw = raw[raw['datetime'] >= window_start].reset_index(drop=True)
+
+                    # Day-scoped fill means only the resumed day onwards has to be rebuilt
+                    new_clean = self._regularize_data(raw[raw['datetime'] >= resume_day].copy(), ticker)
+                    bars = cached['clean'].splice(BarArrays.from_frame(ticker, new_clean)).since(window_start)
+                    fetched = len(new_raw)
+                else:
+                    raw = self._download_bars(ticker, window_start, end_date)
+                    if raw is None or raw.empty:
+                        logger.warning(f"No data received for {ticker}")
+                        return None
+                    # Regularize to 5-minute intervals
+                    bars = BarArrays.from_frame(ticker, self._regularize_data(raw.copy(), ticker))
+                    fetched = len(raw)
+
+                bars = self.history_cache.save(ticker, raw, bars)['clean']
+                logger.info(f"Fetched {fetched} new bars for {ticker} ({len(bars)} records cached)")
+                return bars
+
+            except requests.exceptions.RequestException as e:
+                logger.error(f"API request failed for {ticker}: {e}")
                 return None
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(data)
-            
-            # Rename columns to match expected format
-            df = df.rename(columns={
-                'date': 'datetime',
-                'open': 'open',
-                'high': 'high', 
-                'low': 'low',
-                'close': 'close',
-                'volume': 'volume'
-            })
-            
-            # Convert datetime column
-            df['datetime'] = pd.to_datetime(df['datetime'])
-            df = df.sort_values('datetime')
-            
-            # Regularize to 5-minute intervals
-            df = self._regularize_data(df, ticker)
-            
-            logger.info(f"Fetched {len(df)} records for {ticker}")
-            return df
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API request failed for {ticker}: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Failed to fetch data for {ticker}: {e}")
+            except Exception as e:
+                logger.error(f"Failed to fetch data for {ticker}: {e}")
+                return None
+
+    def _download_bars(self, ticker: str, start_date: datetime, end_date: datetime) -> Optional[pd.DataFrame]:
+        """Download raw 5-minute bars from FMP for a date range"""
+        # Format dates for FMP API
+        from_date = start_date.strftime("%Y-%m-%d")
+        to_date = end_date.strftime("%Y-%m-%d")
+        
+        # FMP API endpoint for intraday data (5-minute intervals)
+        url = f"{self.fmp_base_url}/historical-chart/5min/{ticker}"
+        params = {
+            'from': from_date,
+            'to': to_date,
+            'apikey': self.fmp_api_key
+        }
+        
+        # Pooled FMP session; the historical-chart timeout allows for two years of bars
+        data = fmp_client.get_json(url, params, priority=PREDICTION)
+        if not data:
             return None
-    
+        
+        # Convert to DataFrame
+        df = pd.DataFrame(data)
+        df = df.rename(columns={'date': 'datetime'})
+        df = df[['datetime', 'open', 'high', 'low', 'close', 'volume']]
+        
+        # Convert datetime column
+        df['datetime'] = pd.to_datetime(df['datetime'])
+        return df.sort_values('datetime').reset_index(drop=True)
+
     def _regularize_data(self, df: pd.DataFrame, ticker: str) -> pd.DataFrame:
         """Regularize data to 5-minute intervals """
         FMT = "%Y-%m-%d %H:%M:%S"
@@ -123,6 +279,8 @@ class StockPredictionService:
         
         # Day-scoped forward fill (no overnight leakage)
         prices = prices.groupby(prices.index.normalize()).ffill()
+        # No synthetic bars after the 13:00 close on NYSE half-days
+        prices.loc[nyse_calendar.after_early_close(prices.index.to_series())] = np.nan
         
         # Convert to AutoGluon format
         out = pd.DataFrame({
@@ -137,52 +295,202 @@ class StockPredictionService:
         
         return out
     
+    def _predictions_to_frame(self, predictions) -> pd.DataFrame:
+        """Convert AutoGluon predictions to a flat pandas frame regardless of AG version"""
+        if hasattr(predictions, "to_pandas"):
+            return predictions.to_pandas().reset_index()
+        return predictions.reset_index()
+
+    def _claim_forecast(self, ticker: str, last_timestamp) -> Tuple[Optional[Dict], Optional[Future], bool]:
+        """
+        (cached, future, owner) for a ticker's forecast from last_timestamp: the cached
+        forecast if there is one, otherwise the in-flight future; owner is True when the
+        caller created that future and must compute and release it
+        """
+        key = (ticker, last_timestamp)
+        with self._forecast_lock:
+            entry = self._forecast_cache.get(ticker)
+            if entry is not None and entry['last_timestamp'] == last_timestamp:
+                cached, future, owner, metric = entry, None, False, 'forecast_cache_hits'
+            elif key in self._forecast_inflight:
+                cached, future, owner, metric = None, self._forecast_inflight[key], False, 'forecast_inflight_waits'
+            else:
+                future = self._forecast_inflight[key] = Future()
+                cached, owner, metric = None, True, 'forecast_cache_misses'
+        with self._metrics_lock:
+            self.metrics[metric] += 1
+        return cached, future, owner
+
+    def _release_forecasts(self, owned: Dict[str, Tuple[pd.Timestamp, Future]], results: Dict[str, Dict],
+                           error: Optional[BaseException] = None):
+        """Resolve the futures this caller claimed; a ticker predict() skipped resolves to None"""
+        with self._forecast_lock:
+            for ticker, (last_timestamp, _) in owned.items():
+                self._forecast_inflight.pop((ticker, last_timestamp), None)
+        for ticker, (_, future) in owned.items():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results.get(ticker))
+
+    def _store_forecast(self, entry: Dict) -> Dict:
+        # A newer last bar replaces (and so expires) the previous forecast
+        with self._forecast_lock:
+            self._forecast_cache[entry['ticker']] = entry
+        return entry
+
+    def get_forecast(self, ticker: str) -> Optional[Dict]:
+        """
+        Return the Chronos forecast for a ticker, keyed by its last bar timestamp.
+        Point predictions, interval predictions and the prediction loop all read from
+        this, so one predict() call serves every consumer until a new bar arrives.
+        """
+        return self.get_forecasts([ticker]).get(ticker)
+
+    def get_forecasts(self, tickers: List[str]) -> Dict[str, Dict]:
+        """
+        Batch version of get_forecast: one predict() call for every ticker missing from the
+        cache. Tickers another caller is already predicting are waited for, not predicted again.
+        """
+        unique = list(dict.fromkeys(tickers))
+        frames = {}
+        results: Dict[str, Dict] = {}
+        owned: Dict[str, Tuple[pd.Timestamp, Future]] = {}
+        waiting: Dict[str, Future] = {}
+        entries: Dict[str, Dict] = {}
+        elapsed = None
+        try:
+            for ticker in unique:
+                bars = self.fetch_stock_data(ticker)
+                if bars is None or len(bars) < 365:  # Need sufficient history
+                    logger.warning(f"Insufficient data for {ticker}")
+                    continue
+                cached, future, owner = self._claim_forecast(ticker, bars.last_timestamp)
+                if cached is not None:
+                    results[ticker] = cached
+                elif owner:
+                    frames[ticker] = bars
+                    owned[ticker] = (bars.last_timestamp, future)
+                else:
+                    waiting[ticker] = future
+
+            if frames:
+                started = time.perf_counter()
+                if self.inference_pool is not None and self.inference_pool.is_running:
+                    # Workers read the history this process just synced from the shared cache
+                    entries = self.inference_pool.forecast(list(frames))
+                else:
+                    entries = self._forecast_frames(
+                        {ticker: bars.to_frame(PREDICTION_CONTEXT_BARS) for ticker, bars in frames.items()}
+                    )
+                elapsed = time.perf_counter() - started
+                for ticker, entry in entries.items():
+                    results[ticker] = self._store_forecast(entry)
+        except BaseException as e:
+            self._release_forecasts(owned, results, e)
+            raise
+        # Released before waiting on anyone else's, so two batches can't wait on each other
+        self._release_forecasts(owned, results)
+
+        for ticker, future in waiting.items():
+            try:
+                entry = future.result()
+            except Exception as e:
+                logger.warning(f"Forecast for {ticker} failed in a concurrent request: {e}")
+                continue
+            if entry is not None:
+                results[ticker] = entry
+
+        self._record_chunk_metrics(len(entries), len(unique) - len(results), elapsed)
+        if frames:
+            logger.info(f"Predicted {len(entries)}/{len(frames)} tickers in {elapsed:.2f}s")
+        return results
+
+    def forecast_tickers(self, tickers: List[str]) -> Dict[str, Dict]:
+        """Fetch history and run one in-process predict() call; used by inference workers"""
+        frames = {}
+        for ticker in dict.fromkeys(tickers):
+            bars = self.fetch_stock_data(ticker)
+            if bars is None or len(bars) < 365:
+                logger.warning(f"Insufficient data for {ticker}")
+                continue
+            # Copies the context window (PREDICTION_CONTEXT_BARS) out of the shared memory map
+            frames[ticker] = bars.to_frame(PREDICTION_CONTEXT_BARS)
+        if not frames:
+            return {}
+        return self._forecast_frames(frames)
+
+    def _forecast_frames(self, frames: Dict[str, pd.DataFrame]) -> Dict[str, Dict]:
+        """Stack every ticker as its own item_id and run a single predict() call"""
+        ts_data = _load_autogluon().TimeSeriesDataFrame.from_data_frame(
+            pd.concat(frames.values(), ignore_index=True), id_column="item_id", timestamp_column="timestamp"
+        )
+        predictions = self.predictor.predict(ts_data)
+        pred_df = self._predictions_to_frame(predictions)
+
+        entries = {}
+        for ticker, ticker_preds in pred_df.groupby('item_id', sort=False):
+            if ticker_preds.empty or ticker not in frames:
+                continue
+            df = frames[ticker]
+            entries[ticker] = {
+                'ticker': ticker,
+                'last_timestamp': df['timestamp'].iloc[-1],
+                'last_close': float(df['target'].iloc[-1]),
+                'forecast': ticker_preds.reset_index(drop=True),
+            }
+        return entries
+
+    def _build_prediction_record(self, ticker: str, forecast: Dict) -> Dict:
+        """Build the 5-minute prediction record from a ticker's forecast"""
+        # Get the next prediction (first future point)
+        next_pred = forecast['forecast'].iloc[0]
+
+        return {
+            'ticker': ticker,
+            'predicted_price': float(next_pred.get('mean', next_pred.get('0.5', 0))),
+            'confidence_low': float(next_pred.get('0.1', 0)),
+            'confidence_high': float(next_pred.get('0.9', 0)),
+            'prediction_time': datetime.now(),
+            'horizon_minutes': 5,  # Next 5-minute candle
+            'model_version': 'ChronosFineTuned'
+        }
+
+    def _build_interval_records(self, ticker: str, forecast: Dict) -> List[Dict]:
+        """Build the multi-interval rows from a ticker's forecast"""
+        # Get last known close
+        last_close = forecast['last_close']
+
+        # Define intervals (minutes)
+        intervals = [5, 15, 30, 60, 1440]  # up to 1 day
+        rows = forecast['forecast'].head(len(intervals))
+
+        results = []
+        for i, row in enumerate(rows.itertuples()):
+            predicted_price = float(getattr(row, "mean", getattr(row, "_0_5", 0)))
+            change = ((predicted_price - last_close) / last_close) * 100
+
+            results.append({
+                "ticker": ticker,
+                "interval": f"{intervals[i]}m" if intervals[i] < 1440 else "1d",
+                "predicted_price": predicted_price,
+                "change": change
+            })
+        return results
+
     def make_prediction(self, ticker: str) -> Optional[Dict]:
         """Make prediction for a given ticker"""
         try:
-            if not self.predictor:
+            if not self.model_ready:
                 logger.error("Model not loaded")
                 return None
-            
-            # Fetch recent data
-            df = self.fetch_stock_data(ticker)
-            if df is None or len(df) < 365:  # Need sufficient history
-                logger.warning(f"Insufficient data for {ticker}")
-                return None
-            
-            # Convert to TimeSeriesDataFrame
-            ts_data = TimeSeriesDataFrame.from_data_frame(
-                df, id_column="item_id", timestamp_column="timestamp"
-            )
-            
-            # Make prediction
-            predictions = self.predictor.predict(ts_data)
-            
-            # Convert to pandas for easier handling
-            try:
-                pred_df = predictions.to_pandas().reset_index()
-            except AttributeError:
-                pred_df = predictions.reset_index()
-            
-            # Filter for the specific ticker
-            ticker_preds = pred_df[pred_df['item_id'] == ticker].copy()
-            if ticker_preds.empty:
+
+            forecast = self.get_forecast(ticker)
+            if forecast is None:
                 logger.warning(f"No predictions generated for {ticker}")
                 return None
-            
-            # Get the next prediction (first future point)
-            next_pred = ticker_preds.iloc[0]
-            
-            # Extract prediction values
-            prediction_data = {
-                'ticker': ticker,
-                'predicted_price': float(next_pred.get('mean', next_pred.get('0.5', 0))),
-                'confidence_low': float(next_pred.get('0.1', 0)),
-                'confidence_high': float(next_pred.get('0.9', 0)),
-                'prediction_time': datetime.now(),
-                'horizon_minutes': 5,  # Next 5-minute candle
-                'model_version': 'ChronosFineTuned'
-            }
+
+            prediction_data = self._build_prediction_record(ticker, forecast)
             
             logger.info(f"Generated prediction for {ticker}: ${prediction_data['predicted_price']:.2f}")
             return prediction_data
@@ -191,58 +499,64 @@ class StockPredictionService:
             logger.error(f"Prediction failed for {ticker}: {e}")
             return None
 
-    def make_interval_predictions(self, ticker: str) -> Optional[List[Dict]]:
-        """Generate multi-interval predictions for a given ticker."""
-        try:
-            if not self.predictor:
-                logger.error("Model not loaded")
-                return None
-
-            # Fetch historical stock data
-            df = self.fetch_stock_data(ticker)
-            if df is None or len(df) < 365:
-                logger.warning(f"Insufficient data for {ticker}")
-                return None
+    def make_batch_predictions(self, tickers: List[str], chunk_size: Optional[int] = None) -> Dict[str, Dict]:
+        """
+        Make predictions for many tickers, stacking up to `chunk_size` item_ids into
+        one TimeSeriesDataFrame so each chunk costs a single predict() call.
+        Returns {ticker: prediction_record} for every ticker that produced a forecast.
+        """
+        if not self.model_ready:
+            logger.error("Model not loaded")
+            return {}
 
-            # Convert to TimeSeriesDataFrame for AutoGluon
-            ts_data = TimeSeriesDataFrame.from_data_frame(
-                df, id_column="item_id", timestamp_column="timestamp"
-            )
+        chunk_size = max(1, chunk_size or self.batch_size)
+        tickers = list(dict.fromkeys(tickers))
+        results: Dict[str, Dict] = {}
 
-            # Run Chronos prediction
-            # Run Chronos prediction
-            predictions = self.predictor.predict(ts_data)
+        # With worker processes, hand the pool one chunk per worker at a time
+        step = chunk_size
+        if self.inference_pool is not None and self.inference_pool.is_running:
+            step = chunk_size * self.inference_pool.size
 
-            # Convert predictions safely regardless of AG version
-            if hasattr(predictions, "to_pandas"):
-                pred_df = predictions.to_pandas().reset_index()
-            else:
-                pred_df = predictions.reset_index()
+        for start in range(0, len(tickers), step):
+            chunk = tickers[start:start + step]
+            try:
+                forecasts = self.get_forecasts(chunk)
+                for ticker, forecast in forecasts.items():
+                    results[ticker] = self._build_prediction_record(ticker, forecast)
+            except Exception as e:
+                logger.error(f"Batch prediction failed for chunk {chunk[0]}..{chunk[-1]}: {e}")
 
-            ticker_preds = pred_df[pred_df["item_id"] == ticker]
-            if ticker_preds.empty:
-                logger.warning(f"No predictions for {ticker}")
-                return None
+        with self._metrics_lock:
+            self.metrics['batch_size'] = chunk_size
+        return results
 
-            # Get last known close
-            last_close = float(df["target"].iloc[-1])
+    def _record_chunk_metrics(self, predicted: int, skipped: int, elapsed: Optional[float]):
+        with self._metrics_lock:
+            self.metrics['chunks_run'] += 1
+            self.metrics['tickers_predicted'] += predicted
+            self.metrics['tickers_skipped'] += skipped
+            if elapsed is not None:
+                self.metrics['last_chunk_seconds'] = round(elapsed, 3)
 
-            # Define intervals (minutes)
-            intervals = [5, 15, 30, 60, 1440]  # up to 1 day
-            rows = ticker_preds.head(len(intervals))
+    def get_metrics(self) -> Dict:
+        """Snapshot of batch inference metrics"""
+        with self._metrics_lock:
+            return dict(self.metrics)
 
-            results = []
-            for i, row in enumerate(rows.itertuples()):
-                predicted_price = float(getattr(row, "mean", getattr(row, "_0_5", 0)))
-                change = ((predicted_price - last_close) / last_close) * 100
+    def make_interval_predictions(self, ticker: str) -> Optional[List[Dict]]:
+        """Generate multi-interval predictions for a given ticker."""
+        try:
+            if not self.model_ready:
+                logger.error("Model not loaded")
+                return None
 
-                results.append({
-                    "ticker": ticker,
-                    "interval": f"{intervals[i]}m" if intervals[i] < 1440 else "1d",
-                    "predicted_price": predicted_price,
-                    "change": change
-                })
+            forecast = self.get_forecast(ticker)
+            if forecast is None:
+                logger.warning(f"No predictions for {ticker}")
+                return None
 
+            results = self._build_interval_records(ticker, forecast)
             logger.info(f"Generated {len(results)} interval predictions for {ticker}")
             return results
 
@@ -250,7 +564,6 @@ class StockPredictionService:
             logger.error(f"Prediction failed for {ticker}: {e}")
             return None
 
-    
     def save_prediction(self, prediction_data: Dict):
         """Save prediction to database"""
         try:
@@ -286,12 +599,18 @@ class StockPredictionService:
         
         while self.is_running:
             try:
+                cycle_started = time.perf_counter()
+                # One predict() call per chunk of tickers instead of one per ticker
+                batch_results = self.make_batch_predictions(tickers)
                 for ticker in tickers:
-                    # Make prediction
-                    prediction_data = self.make_prediction(ticker)
+                    prediction_data = batch_results.get(ticker)
                     if prediction_data:
                         # Save to database
                         self.save_prediction(prediction_data)
+
+                with self._metrics_lock:
+                    self.metrics['last_cycle_seconds'] = round(time.perf_counter() - cycle_started, 3)
+                    self.metrics['last_cycle_at'] = datetime.now()
                 
                 # Wait for 5 minutes (300 seconds)
                 time.sleep(300)
@@ -307,8 +626,8 @@ class StockPredictionService:
             return
         
         # Only load model if not already loaded (avoid redundant loading)
-        if self.predictor is None:
-            if not self.load_model():
+        if not self.model_ready:
+            if not self.initialize_model():
                 logger.error("Failed to load model, cannot start predictions")
                 return
         else:
@@ -376,10 +695,7 @@ class StockPredictionService:
         try:
             url = f"{self.fmp_base_url}/stock_market/{mover_type}"
             params = {"apikey": self.fmp_api_key}
-            # Add timeout to prevent indefinite hangs
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = fmp_client.get_json(url, params, priority=PREDICTION)
 
             trending = [
                 d["ticker"] for d in data
@@ -398,3 +714,5 @@ class StockPredictionService:
 
 # Global instance
 prediction_service = StockPredictionService()
+
+IMPORT_TIMINGS['stock_prediction_service'] = round(time.perf_counter() - _module_import_started, 3)
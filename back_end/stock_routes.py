@@ -6,7 +6,7 @@ from auth import get_current_user
 from pydantic import BaseModel
 import requests
 from dotenv import load_dotenv
-from stock_prediction_service import prediction_service
+from stock_prediction_service import prediction_service, IMPORT_TIMINGS
 from eod_updater import eod_updater
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -16,13 +16,25 @@ from concurrent.futures import ThreadPoolExecutor
 import threading
 import logging
 
-from stock_cache_service import fetch_symbol_from_fmp, fetch_company_snapshot, normalize_ticker_symbol
+from stock_cache_service import cache_stats, fetch_symbol_from_fmp_async, fetch_company_snapshot_async, normalize_ticker_symbol
+from request_coalescer import RequestCoalescer
+from fmp_client import fmp_call_counter
+from fmp_budget import budget_stats
+from market_snapshot import market_snapshot
+from quote_hub import QuoteSubscriber, quote_hub
+from bar_cache import bar_cache
+from ticker_search import ticker_search
+from news_cache import news_cache
+from prediction_config import MODEL_RETRY_AFTER_SECONDS
 
 logger = logging.getLogger(__name__)
 
 # Thread pool executor for CPU-intensive operations
 executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="stock_predictions")
 
+# Concurrent prediction requests for the same ticker share one executor job
+prediction_coalescer = RequestCoalescer()
+
 
 load_dotenv()
 
@@ -61,8 +73,25 @@ def check_subscription(
     return True
 
 
+def require_model_ready():
+    """Dependency that fails fast with 503 + Retry-After until the model is warmed up"""
+    if prediction_service.model_ready:
+        return True
+    state = prediction_service.state
+    if state == 'failed':
+        detail = "Prediction model failed to load"
+    else:
+        detail = f"Prediction model is {state}, please retry shortly"
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=detail,
+        headers={"Retry-After": str(MODEL_RETRY_AFTER_SECONDS)}
+    )
+
+
 class StockRequest(BaseModel):
     ticker: str
+    action: str = "subscribe"
 
 class StockCustomBars(BaseModel):
     tick: str
@@ -90,10 +119,24 @@ class PredictionRequest(BaseModel):
 # WebSocket endpoint for retrieving the last quote.
 @router.websocket("/ws/getlastquote")
 async def websocket_lastquote(websocket: WebSocket):
-
+    """
+    Each {"ticker": ...} message subscribes this socket to that ticker on the shared
+    quote hub; {"ticker": ..., "action": "unsubscribe"} drops it. Quotes are pushed
+    as they change, with the latest known quote sent back right after subscribing.
+    """
     await websocket.accept()
-    try:
+    subscriber = QuoteSubscriber()
+
+    async def pump():
+        try:
+            while True:
+                for quote in await subscriber.next():
+                    await websocket.send_json(quote)
+        except (WebSocketDisconnect, RuntimeError):
+            pass  # socket closed; the receive loop cleans up
 
+    sender = asyncio.create_task(pump())
+    try:
         while True:
             data = await websocket.receive_json()
 
@@ -103,34 +146,16 @@ async def websocket_lastquote(websocket: WebSocket):
                 await websocket.send_json({"error": "Invalid data format", "detail": str(validation_error)})
                 continue
 
-
-            try:
-                # FMP API endpoint for real-time quote
-                # Run blocking request in thread executor to avoid freezing event loop
-                url = f"{fmp_base_url}/quote/{request.ticker}"
-                params = {'apikey': fmp_api_key}
-                
-                loop = asyncio.get_event_loop()
-                response = await loop.run_in_executor(
-                    executor,
-                    lambda: requests.get(url, params=params, timeout=10)
-                )
-                response.raise_for_status()
-                
-                quote_data = response.json()
-                if quote_data:
-                    quote = quote_data[0]  # FMP returns array, get first item
-                else:
-                    quote = {"error": "No quote data available"}
-
-                await websocket.send_json(quote)
-            except requests.exceptions.RequestException as api_error:
-                await websocket.send_json({"error": "Failed to fetch quote", "detail": str(api_error)})
-            except Exception as api_error:
-                await websocket.send_json({"error": "Failed to fetch quote", "detail": str(api_error)})
+            if request.action == "unsubscribe":
+                quote_hub.unsubscribe(request.ticker, subscriber)
+            else:
+                quote_hub.subscribe(request.ticker, subscriber)
     except WebSocketDisconnect:
 
         print("Client disconnected from /ws/getlastquote")
+    finally:
+        quote_hub.unsubscribe_all(subscriber)
+        sender.cancel()
 
 
 @router.websocket("/ws/getcustombars")
@@ -159,23 +184,8 @@ async def websocket_custombars(websocket: WebSocket):
                 
                 fmp_timeframe = timeframe_map.get(request.timeframe, "1min")
                 
-                # FMP API endpoint for historical chart data
-                # Run blocking request in thread executor to avoid freezing event loop
-                url = f"{fmp_base_url}/historical-chart/{fmp_timeframe}/{request.tick}"
-                params = {
-                    'from': request.From,
-                    'to': request.To,
-                    'apikey': fmp_api_key
-                }
-                
-                loop = asyncio.get_event_loop()
-                response = await loop.run_in_executor(
-                    executor,
-                    lambda: requests.get(url, params=params, timeout=30)
-                )
-                response.raise_for_status()
-                
-                custombars = response.json()
+                # Closed sessions come from the shared bar cache; only missing days hit FMP
+                custombars = await bar_cache.get_bars(request.tick, fmp_timeframe, request.From, request.To)
                 await websocket.send_json(custombars)
             except requests.exceptions.RequestException as api_error:
                 await websocket.send_json({"error": "Failed to fetch custom bars", "detail": str(api_error)})
@@ -241,13 +251,25 @@ async def get_prediction_service_status(user: dict = Depends(get_current_user)):
     """Get the status of the prediction service"""
     return {
         "is_running": prediction_service.is_running,
-        "model_loaded": prediction_service.predictor is not None
+        "model_loaded": prediction_service.model_ready,
+        "readiness": prediction_service.get_readiness(),
+        "inference_workers": prediction_service.inference_pool.size if prediction_service.inference_pool else 0,
+        "batch_metrics": prediction_service.get_metrics(),
+        "coalescing": prediction_coalescer.stats(),
+        "import_timings": dict(IMPORT_TIMINGS),
+        "fmp_calls": fmp_call_counter.stats(),
+        "fmp_budget": budget_stats(),
+        "stock_cache": cache_stats(),
+        "quote_hub": quote_hub.stats(),
+        "bar_cache": bar_cache.stats(),
+        "news_cache": news_cache.stats()
     }
 
 @router.post("/predictions/generate")
 async def generate_immediate_prediction(
     request: PredictionRequest,
-    _: bool = Depends(check_subscription)
+    _: bool = Depends(check_subscription),
+    __: bool = Depends(require_model_ready)
 ):
     """Generate immediate predictions for specified tickers (not saved to DB)"""
     try:
@@ -256,10 +278,9 @@ async def generate_immediate_prediction(
         results = []
         
         async def make_prediction_async(ticker: str):
-            return await loop.run_in_executor(
-                executor,
-                prediction_service.make_prediction,
-                ticker
+            return await prediction_coalescer.run(
+                ("point", ticker),
+                lambda: loop.run_in_executor(executor, prediction_service.make_prediction, ticker)
             )
         
         # Process all tickers concurrently
@@ -282,7 +303,8 @@ async def generate_immediate_prediction(
 @router.post("/predictions/generate-intervals")
 async def generate_interval_predictions(
     request: PredictionRequest,
-    _: bool = Depends(check_subscription)
+    _: bool = Depends(check_subscription),
+    __: bool = Depends(require_model_ready)
 ):
     """Generate multi-interval predictions (for Stock Insights)."""
     try:
@@ -291,10 +313,9 @@ async def generate_interval_predictions(
         results = []
         
         async def make_interval_predictions_async(ticker: str):
-            return await loop.run_in_executor(
-                executor,
-                prediction_service.make_interval_predictions,
-                ticker
+            return await prediction_coalescer.run(
+                ("intervals", ticker),
+                lambda: loop.run_in_executor(executor, prediction_service.make_interval_predictions, ticker)
             )
         
         # Process all tickers concurrently
@@ -371,55 +392,10 @@ async def fetch_gainers():
     Prioritizes high-value stocks (price >= $80),
     then mid-tier (20–79), then fallback (<20),
     always avoiding ETFs and forex/pair symbols.
+    Served from the shared, background-refreshed market snapshot.
     """
-    try:
-        url = f"{fmp_base_url}/stock_market/gainers"
-        params = {"apikey": fmp_api_key}
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-
-        def clean_entry(s):
-            try:
-                price = float(s.get("price", 0))
-                change = float(s.get("change", 0))
-                pct = float(str(s.get("changesPercentage", "0")).replace("%", "").replace("+", ""))
-                name = s.get("name") or s.get("symbol")
-                symbol = s.get("symbol", "").upper()
-
-                # Filter early for obvious junk
-                if not symbol or "ETF" in (name or "") or any(x in symbol for x in ["/", "="]):
-                    return None
-
-                return {
-                    "symbol": symbol,
-                    "name": name,
-                    "price": round(price, 2),
-                    "change": round(change, 2),
-                    "changesPercentage": round(pct, 2),
-                }
-            except (TypeError, ValueError):
-                return None
-
-        cleaned = [e for s in data if (e := clean_entry(s))]
-
-        # Split into tiers
-        high = [e for e in cleaned if e["price"] >= 80]
-        mid = [e for e in cleaned if 20 <= e["price"] < 80]
-        low = [e for e in cleaned if e["price"] < 20]
-
-        # Sort gainers descending by percentage change
-        high.sort(key=lambda x: x["changesPercentage"], reverse=True)
-        mid.sort(key=lambda x: x["changesPercentage"], reverse=True)
-        low.sort(key=lambda x: x["changesPercentage"], reverse=True)
-
-        # Combine tiers to always get 5 results
-        combined = (high + mid + low)[:5]
-
-        return combined
-
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch gainers: {str(e)}")
+    snapshot = await market_snapshot.get()
+    return [_mover_response(e) for e in snapshot["gainers"]]
 
 
 @router.get("/losers")
@@ -429,59 +405,26 @@ async def fetch_losers():
     Prioritizes high-value stocks (price >= $80),
     then mid-tier (20–79), then fallback (<20),
     always avoiding ETFs and forex/pair symbols.
+    Served from the shared, background-refreshed market snapshot.
     """
-    try:
-        url = f"{fmp_base_url}/stock_market/losers"
-        params = {"apikey": fmp_api_key}
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-
-        def clean_entry(s):
-            try:
-                price = float(s.get("price", 0))
-                change = float(s.get("change", 0))
-                pct = float(str(s.get("changesPercentage", "0")).replace("%", "").replace("+", ""))
-                name = s.get("name") or s.get("symbol")
-                symbol = s.get("symbol", "").upper()
-
-                if not symbol or "ETF" in (name or "") or any(x in symbol for x in ["/", "="]):
-                    return None
-
-                return {
-                    "symbol": symbol,
-                    "name": name,
-                    "price": round(price, 2),
-                    "change": round(change, 2),
-                    "changesPercentage": round(pct, 2),
-                }
-            except (TypeError, ValueError):
-                return None
-
-        cleaned = [e for s in data if (e := clean_entry(s))]
-
-        # Split into tiers
-        high = [e for e in cleaned if e["price"] >= 80]
-        mid = [e for e in cleaned if 20 <= e["price"] < 80]
-        low = [e for e in cleaned if e["price"] < 20]
-
-        # Sort losers ascending by percentage change
-        high.sort(key=lambda x: x["changesPercentage"])
-        mid.sort(key=lambda x: x["changesPercentage"])
-        low.sort(key=lambda x: x["changesPercentage"])
+    snapshot = await market_snapshot.get()
+    return [_mover_response(e) for e in snapshot["losers"]]
 
-        combined = (high + mid + low)[:5]
 
-        return combined
-
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch losers: {str(e)}")
+def _mover_response(entry: dict) -> dict:
+    return {
+        "symbol": entry["symbol"],
+        "name": entry["name"],
+        "price": entry["price"],
+        "change": entry["change"],
+        "changesPercentage": entry["change_percent"],
+    }
     
 @router.get("/company/{ticker}")
 async def get_company_snapshot(ticker: str):
     """Return cached or fresh company profile."""
     clean_ticker = normalize_ticker_symbol(ticker)
-    data = fetch_company_snapshot(clean_ticker)
+    data = await fetch_company_snapshot_async(clean_ticker)
     return data
 
 @router.get("/news/{ticker}")
@@ -492,26 +435,13 @@ async def get_company_news(ticker: str):
     Each entry: {title, publishedDate, site, url, image}
     """
     try:
-        url = f"{fmp_base_url}/stock_news"
-        params = {"tickers": ticker.upper(), "limit": 5, "apikey": fmp_api_key}
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        # Served from the shared news cache; unseen tickers are batched into one FMP call
+        data = await news_cache.get(ticker)
 
-        if not data or not isinstance(data, list) or len(data) == 0:
+        if not data:
             raise HTTPException(status_code=404, detail=f"No news found for {ticker}")
 
-        cleaned = []
-        for n in data:
-            cleaned.append({
-                "title": n.get("title", ""),
-                "publishedDate": n.get("publishedDate", ""),
-                "site": n.get("site", ""),
-                "url": n.get("url", ""),
-                "image": n.get("image", "")
-            })
-
-        return cleaned[:5]
+        return data
 
     except requests.exceptions.RequestException as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch news: {str(e)}")
@@ -520,7 +450,7 @@ async def get_company_news(ticker: str):
 @router.get("/symbol/{ticker}")
 async def get_symbol_with_exchange(ticker: str):
     """Return TradingView-ready symbol with exchange prefix (cached)."""
-    exchange = fetch_symbol_from_fmp(ticker)
+    exchange = await fetch_symbol_from_fmp_async(ticker)
     tv_ticker = normalize_ticker_symbol(ticker, for_tradingview=True)
     return {"symbol": f"{exchange}:{tv_ticker}"}
 
@@ -536,47 +466,8 @@ async def search_stocks(query: str, limit: int = 10):
         if not query or len(query) < 2:
             return []
         
-        if not fmp_api_key:
-            raise HTTPException(
-                status_code=500,
-                detail="FMP API key not configured"
-            )
-        
-        url = f"{fmp_base_url}/search"
-        params = {
-            'query': query,
-            'limit': limit,
-            'apikey': fmp_api_key
-        }
-        
-        # Run in thread executor to avoid blocking
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            executor,
-            lambda: requests.get(url, params=params, timeout=10)
-        )
-        response.raise_for_status()
-        data = response.json()
-        
-        # Handle error responses from FMP API
-        if not isinstance(data, list):
-            if isinstance(data, dict) and (data.get('error') or data.get('message')):
-                error_msg = data.get('error') or data.get('message')
-                logger.error(f"FMP API error: {error_msg}")
-                return []
-            return []
-        
-        # Format results to match frontend expectations
-        results = []
-        for item in data:
-            if item and item.get('symbol'):
-                results.append({
-                    "symbol": item.get("symbol", ""),
-                    "name": item.get("name", ""),
-                    "exchange": item.get("exchangeShortName", "")
-                })
-        
-        return results
+        # Local index first; FMP search is only asked when nothing matches
+        return await ticker_search.search(query, limit)
     
     except requests.exceptions.RequestException as e:
         logger.error(f"FMP search API error: {e}")
@@ -645,6 +536,36 @@ async def eod_status(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve EOD status: {str(e)}")
 
+@router.get("/eod/datasets")
+async def eod_datasets(
+    user: dict = Depends(get_current_user)
+):
+    """Row counts and time ranges of every stored series (read from the store manifests)"""
+    try:
+        return eod_updater.dataset_summary()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read dataset manifest: {str(e)}")
+
+class EODExportRequest(BaseModel):
+    symbol: str
+    freq: str = "5min"
+
+@router.post("/eod/export")
+async def export_eod_excel(
+    request: EODExportRequest,
+    user: dict = Depends(get_current_user)
+):
+    """Export a symbol's stored bars to Excel on demand (no longer part of the nightly run)"""
+    try:
+        symbol = request.symbol.strip().upper().replace(".", "-")
+        loop = asyncio.get_event_loop()
+        files = await loop.run_in_executor(executor, eod_updater.export_excel, symbol, request.freq)
+        return {"status": "ok", "symbol": symbol, "files": files}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to export {request.symbol}: {str(e)}")
+
 @router.post("/eod/update-all")
 async def update_all_stocks(
     user: dict = Depends(get_current_user)
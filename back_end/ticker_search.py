@@ -0,0 +1,262 @@
+"""
+In-process ticker search for /stocks/search.
+
+The index is seeded from stock_tickers.txt (symbols only, ranked first) and filled
+with names and exchanges from FMP's full symbol list, re-downloaded every
+TICKER_INDEX_REFRESH_HOURS by a background task. Lookups are bisects over sorted
+symbol and name-word lists plus a one-edit "delete" table for typos, so a query
+costs well under a millisecond and never touches the network. FMP's search
+endpoint is only called when the index has no match at all; its answer is cached
+per query and its symbols are folded into the index on the next rebuild.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import re
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from fmp_budget import BACKFILL
+from fmp_client import FMP_BASE_URL, async_fmp_client
+from ttl_cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+TICKER_FILE = Path(__file__).resolve().parent.parent / "stock_tickers.txt"
+TICKER_INDEX_REFRESH_HOURS = float(os.getenv("TICKER_INDEX_REFRESH_HOURS", "24"))
+# Prefix matches looked at per query before ranking (bounds short, common prefixes)
+MAX_CANDIDATES = 2000
+# Shortest symbol / name word that typo matching is tried for
+MIN_FUZZY_LENGTH = 3
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _deletes(word: str) -> Set[str]:
+    """word with each single character removed"""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class TickerIndex:
+    """Immutable search structures; rebuilt and swapped as a whole on refresh"""
+
+    def __init__(self, entries: Iterable[Dict[str, str]], seeded: Set[str]):
+        self.entries: List[Dict[str, str]] = []
+        self.by_symbol: Dict[str, int] = {}
+        for e in entries:
+            symbol = (e.get("symbol") or "").upper().strip()
+            if not symbol:
+                continue
+            entry = {"symbol": symbol, "name": e.get("name") or "", "exchange": e.get("exchange") or ""}
+            if symbol in self.by_symbol:
+                # Keep the first sighting but fill in details it was missing
+                kept = self.entries[self.by_symbol[symbol]]
+                kept["name"] = kept["name"] or entry["name"]
+                kept["exchange"] = kept["exchange"] or entry["exchange"]
+                continue
+            self.by_symbol[symbol] = len(self.entries)
+            self.entries.append(entry)
+
+        # Seeded tickers first, then shorter symbols
+        self.rank = [(0 if e["symbol"] in seeded else 1, len(e["symbol"]), e["symbol"]) for e in self.entries]
+        self.symbols = sorted((e["symbol"], i) for i, e in enumerate(self.entries))
+
+        self.name_words = [_WORD.findall(e["name"].lower()) for e in self.entries]
+        words: Dict[str, Set[int]] = {}
+        for i, name_words in enumerate(self.name_words):
+            for w in name_words:
+                words.setdefault(w, set()).add(i)
+        self.words = sorted(words)
+        self.word_entries = words
+
+        self.symbol_deletes: Dict[str, Set[int]] = {}
+        for symbol, i in self.symbols:
+            if len(symbol) >= MIN_FUZZY_LENGTH:
+                for d in _deletes(symbol) | {symbol}:
+                    self.symbol_deletes.setdefault(d, set()).add(i)
+        self.word_deletes: Dict[str, Set[str]] = {}
+        for w in self.words:
+            if len(w) >= MIN_FUZZY_LENGTH + 1:
+                for d in _deletes(w) | {w}:
+                    self.word_deletes.setdefault(d, set()).add(w)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _symbol_prefix(self, prefix: str) -> List[int]:
+        found = []
+        i = bisect_left(self.symbols, (prefix,))
+        while i < len(self.symbols) and self.symbols[i][0].startswith(prefix) and len(found) < MAX_CANDIDATES:
+            found.append(self.symbols[i][1])
+            i += 1
+        return found
+
+    def _word_prefix(self, prefix: str) -> Set[int]:
+        found: Set[int] = set()
+        i = bisect_left(self.words, prefix)
+        while i < len(self.words) and self.words[i].startswith(prefix) and len(found) < MAX_CANDIDATES:
+            found |= self.word_entries[self.words[i]]
+            i += 1
+        return found
+
+    def _fuzzy(self, q_symbol: str, tokens: List[str]) -> Set[int]:
+        found: Set[int] = set()
+        if len(q_symbol) >= MIN_FUZZY_LENGTH:
+            for d in _deletes(q_symbol) | {q_symbol}:
+                found |= self.symbol_deletes.get(d, set())
+        for token in tokens:
+            if len(token) >= MIN_FUZZY_LENGTH:
+                for d in _deletes(token) | {token}:
+                    for w in self.word_deletes.get(d, ()):
+                        found |= self.word_entries[w]
+        return found
+
+    def search(self, query: str, limit: int) -> List[Dict[str, str]]:
+        """Exact symbol, then symbol prefix, then name-word prefix, then one-typo matches"""
+        q_symbol = query.strip().upper()
+        tokens = _WORD.findall(query.lower())
+        if not q_symbol:
+            return []
+
+        tiers: List[Tuple[int, Iterable[int]]] = []
+        if q_symbol in self.by_symbol:
+            tiers.append((0, [self.by_symbol[q_symbol]]))
+        tiers.append((1, self._symbol_prefix(q_symbol)))
+        if tokens:
+            # Look up the longest word, then require every other word as a word prefix
+            lookup = max(tokens, key=len)
+            matches = self._word_prefix(lookup)
+            others = [t for t in tokens if t != lookup]
+            if others:
+                matches = {i for i in matches
+                           if all(any(w.startswith(t) for w in self.name_words[i])
+                                  for t in others)}
+            tiers.append((2, matches))
+
+        seen: Set[int] = set()
+        ranked = []
+        for tier, ids in tiers:
+            for i in ids:
+                if i not in seen:
+                    seen.add(i)
+                    ranked.append(((tier,) + self.rank[i], i))
+        if not ranked:
+            ranked = [((3,) + self.rank[i], i) for i in self._fuzzy(q_symbol, tokens)]
+        return [dict(self.entries[i]) for _, i in heapq.nsmallest(limit, ranked)]
+
+
+def _load_seed_symbols() -> List[str]:
+    try:
+        with open(TICKER_FILE, "r", encoding="utf-8-sig") as f:
+            return [line.strip().upper() for line in f if line.strip()]
+    except OSError as e:
+        logger.warning(f"Ticker search: could not read {TICKER_FILE}: {e}")
+        return []
+
+
+class TickerSearch:
+    def __init__(self, refresh_hours: float = TICKER_INDEX_REFRESH_HOURS):
+        self.refresh_seconds = refresh_hours * 3600
+        self.seeded = set(_load_seed_symbols())
+        self._listing: List[Dict[str, str]] = [{"symbol": s} for s in sorted(self.seeded)]
+        self._extra: Dict[str, Dict[str, str]] = {}
+        self._fallback_cache = LRUTTLCache("ticker_search", 1000, self.refresh_seconds)
+        self.index = TickerIndex(self._listing, self.seeded)
+        self.listing_loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self.lookups = 0
+        self.local_hits = 0
+        self.fallbacks = 0
+        self.refresh_errors = 0
+
+    def _rebuild(self, entries: List[Dict[str, str]]):
+        self.index = TickerIndex(entries, self.seeded)
+
+    async def refresh(self):
+        """Download FMP's symbol list and swap in a rebuilt index"""
+        url = f"{FMP_BASE_URL}/stock/list"
+        data = await async_fmp_client.get_json(url, {"apikey": os.getenv("FMP_API_KEY")}, timeout=60, priority=BACKFILL)
+        listing = [
+            {"symbol": d["symbol"], "name": d.get("name") or "", "exchange": d.get("exchangeShortName") or ""}
+            for d in data or [] if isinstance(d, dict) and d.get("symbol")
+        ]
+        if not listing:
+            raise ValueError("empty symbol list")
+        # Seeded symbols FMP doesn't list stay searchable by symbol
+        listed = {d["symbol"].upper() for d in listing}
+        self._listing = listing + [{"symbol": s} for s in sorted(self.seeded - listed)]
+        # Snapshot on the loop: search() adds to _extra while the thread builds
+        await asyncio.to_thread(self._rebuild, list(self._extra.values()) + self._listing)
+        self.listing_loaded_at = time.time()
+        logger.info(f"Ticker search index rebuilt: {len(self.index)} symbols")
+
+    async def _fmp_search(self, query: str, limit: int) -> List[Dict[str, str]]:
+        params = {"query": query, "limit": limit, "apikey": os.getenv("FMP_API_KEY")}
+        data = await async_fmp_client.get_json(f"{FMP_BASE_URL}/search", params)
+        if not isinstance(data, list):
+            if isinstance(data, dict) and (data.get("error") or data.get("message")):
+                logger.error(f"FMP API error: {data.get('error') or data.get('message')}")
+            return []
+        return [
+            {"symbol": item.get("symbol", ""), "name": item.get("name", ""), "exchange": item.get("exchangeShortName", "")}
+            for item in data if item and item.get("symbol")
+        ]
+
+    async def search(self, query: str, limit: int = 10) -> List[Dict[str, str]]:
+        self.lookups += 1
+        results = self.index.search(query, limit)
+        if results:
+            self.local_hits += 1
+            return results
+        self.fallbacks += 1
+        results = await self._fallback_cache.get_or_load(
+            (query.strip().lower(), limit), lambda: self._fmp_search(query, limit)
+        )
+        for r in results:
+            if r["symbol"].upper() not in self.index.by_symbol:
+                self._extra[r["symbol"].upper()] = r
+        return results
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+                await asyncio.sleep(self.refresh_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.warning(f"Ticker search index refresh failed: {e}")
+                # Retry sooner than a full period; the seed index keeps serving meanwhile
+                await asyncio.sleep(min(self.refresh_seconds, 300))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "symbols": len(self.index),
+            "listing_loaded_at": self.listing_loaded_at,
+            "lookups": self.lookups,
+            "local_hits": self.local_hits,
+            "fmp_fallbacks": self.fallbacks,
+            "fallback_cache": self._fallback_cache.stats(),
+            "refresh_errors": self.refresh_errors,
+        }
+
+
+# Shared by /stocks/search in this process
+ticker_search = TickerSearch()
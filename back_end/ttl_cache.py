@@ -0,0 +1,269 @@
+"""
+Size-bounded LRU cache with per-entry TTL and stale-while-revalidate.
+
+Entries younger than `ttl` are fresh. Entries older than that, but younger than
+ttl + max_stale, are still returned right away while a single background refresh
+per key replaces them. Only a true miss makes the caller wait for the loader, and
+concurrent misses of one key share a single load.
+
+An optional SQLite backend (one file per host) sits behind the in-memory LRU, so
+every uvicorn worker on the host sees entries that any of them fetched. A stale
+entry is checked against the backend before it is refreshed. get_or_load() does its
+backend reads and writes in a thread so they don't block the event loop.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteCacheBackend:
+    """Shared on-disk store: one row per (namespace, key) with a JSON value"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_age ON cache (namespace, stored_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers in other workers proceed during writes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        row = self._conn().execute(
+            "SELECT value, stored_at FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, namespace: str, key: str, value: Any, stored_at: float):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, stored_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), stored_at),
+            )
+
+    def trim(self, namespace: str, maxsize: int):
+        """Drop the oldest rows beyond maxsize"""
+        with self._conn() as conn:
+            conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key NOT IN ("
+                " SELECT key FROM cache WHERE namespace = ? ORDER BY stored_at DESC LIMIT ?)",
+                (namespace, namespace, maxsize),
+            )
+
+
+class LRUTTLCache:
+    def __init__(self, name: str, maxsize: int, ttl: float, max_stale: float = 0.0,
+                 backend: Optional[SQLiteCacheBackend] = None):
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.backend = backend
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing: Set[Hashable] = set()
+        # Event-loop only: in-flight loads of missing keys, and background refreshes
+        self._loading: Dict[Hashable, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._backend_writes = 0
+        self.counters = {
+            "hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0,
+            "backend_hits": 0, "refreshes": 0, "refresh_errors": 0,
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _memory_entry(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        return entry
+
+    def _backend_get(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """(value, stored_at) from the shared backend (blocking)"""
+        try:
+            return self.backend.get(self.name, str(key))
+        except sqlite3.Error as e:
+            logger.warning(f"{self.name} cache backend read failed: {e}")
+            return None
+
+    def _backend_set(self, key: Hashable, value: Any, stored_at: float, trim: bool):
+        """Blocking write to the shared backend"""
+        try:
+            self.backend.set(self.name, str(key), value, stored_at)
+            if trim:
+                self.backend.trim(self.name, self.maxsize)
+        except sqlite3.Error as e:
+            logger.warning(f"{self.name} cache backend write failed: {e}")
+
+    def _adopt(self, key: Hashable, entry: Optional[Tuple[Any, float]],
+               shared: Optional[Tuple[Any, float]]) -> Optional[Tuple[Any, float]]:
+        """The newer of the memory entry and the backend row, remembering the row if it wins"""
+        if shared is not None and (entry is None or shared[1] > entry[1]):
+            self._count("backend_hits")
+            self._remember(key, *shared)
+            return shared
+        return entry
+
+    def _lookup(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """(value, age) from memory, falling back to the shared backend"""
+        entry = self._memory_entry(key)
+        if entry is None and self.backend is not None:
+            entry = self._adopt(key, entry, self._backend_get(key))
+        if entry is None:
+            return None
+        return entry[0], time.time() - entry[1]
+
+    async def _lookup_async(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """_lookup off the event loop; a stale memory entry is also checked against the
+        backend, where another worker may already have stored a fresher value"""
+        entry = self._memory_entry(key)
+        if self.backend is not None and (entry is None or time.time() - entry[1] >= self.ttl):
+            entry = self._adopt(key, entry, await asyncio.to_thread(self._backend_get, key))
+        if entry is None:
+            return None
+        return entry[0], time.time() - entry[1]
+
+    def _remember(self, key: Hashable, value: Any, stored_at: float):
+        with self._lock:
+            self._entries[key] = (value, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Fresh value or None (no stale serving, no refresh)"""
+        entry = self._lookup(key)
+        if entry is not None and entry[1] < self.ttl:
+            self._count("hits")
+            return entry[0]
+        self._count("misses")
+        return None
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Value if it is still servable (fresh or within max_stale); no counters, no refresh"""
+        entry = self._lookup(key)
+        if entry is not None and entry[1] < self.ttl + self.max_stale:
+            return entry[0]
+        return None
+
+    def _store(self, key: Hashable, value: Any) -> Optional[Tuple]:
+        """Remember value; returns the _backend_set arguments if it also goes to the backend"""
+        stored_at = time.time()
+        self._remember(key, value, stored_at)
+        if self.backend is None:
+            return None
+        with self._lock:
+            self._backend_writes += 1
+            # Trimming scans the table, so only do it every so often
+            trim = self._backend_writes % 100 == 0
+        return key, value, stored_at, trim
+
+    def set(self, key: Hashable, value: Any):
+        write = self._store(key, value)
+        if write is not None:
+            self._backend_set(*write)
+
+    async def set_async(self, key: Hashable, value: Any):
+        """set() with the backend write off the event loop"""
+        write = self._store(key, value)
+        if write is not None:
+            await asyncio.to_thread(self._backend_set, *write)
+
+    def _classify(self, entry: Optional[Tuple[Any, float]]) -> Tuple[Optional[Any], bool]:
+        """(value, needs_refresh); value is None on a miss or an entry too stale to serve"""
+        if entry is not None and entry[1] < self.ttl:
+            self._count("hits")
+            return entry[0], False
+        if entry is not None and entry[1] < self.ttl + self.max_stale:
+            self._count("stale_hits")
+            return entry[0], True
+        self._count("misses")
+        return None, True
+
+    def _claim_refresh(self, key: Hashable) -> bool:
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.counters["refreshes"] += 1
+            return True
+
+    def _release_refresh(self, key: Hashable):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value, serving stale entries while one background task reloads them"""
+        value, needs_refresh = self._classify(await self._lookup_async(key))
+        if value is None:
+            return await self._load(key, loader)
+        if needs_refresh and self._claim_refresh(key):
+            # The loop only keeps weak references to tasks; hold on to it until it is done
+            task = asyncio.get_running_loop().create_task(self._refresh_async(key, loader))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return value
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Load a missing key once, however many callers miss it at the same time"""
+        task = self._loading.get(key)
+        if task is None:
+            task = self._loading[key] = asyncio.get_running_loop().create_task(self._load_and_store(key, loader))
+            task.add_done_callback(lambda t: self._load_done(key, t))
+        # A caller that goes away doesn't cancel the load for the others
+        return await asyncio.shield(task)
+
+    async def _load_and_store(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = await loader()
+        await self.set_async(key, value)
+        return value
+
+    def _load_done(self, key: Hashable, task: asyncio.Task):
+        if self._loading.get(key) is task:
+            del self._loading[key]
+        # Every waiter may have gone away; don't log the error as never retrieved
+        if not task.cancelled():
+            task.exception()
+
+    async def _refresh_async(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        try:
+            await self.set_async(key, await loader())
+        except Exception as e:
+            self._count("refresh_errors")
+            logger.warning(f"{self.name} cache refresh failed for {key}: {e}")
+        finally:
+            self._release_refresh(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "shared_backend": self.backend is not None,
+                **self.counters,
+            }